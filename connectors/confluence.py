@@ -1,9 +1,21 @@
-import requests, re, time
+import calendar, json, os, random, re, sys, threading, time
+from collections import OrderedDict
+from concurrent.futures import as_completed
+from copy import deepcopy
 from datetime import datetime
+from queue import Empty, Queue
 from atlassian import Confluence
-from .models import ConnectorModel, Instruction, Result, Question
+from .models import STATE_DIR, ConnectorModel, Instruction, OptionRows, Result, Question
 from .output_printer import OutputPrinter
 from .editor import editor
+from .worker_pool import WorkerPool, parse_selection
+from .scheduler import RequestScheduler, ScheduledSession
+from .replay import RecordingSession, ReplaySession
+from .table_index import TableIndex
+from .revisions import RevisionStore, describe_changes
+from .feed import FeedState
+from .page_references import PageReferences
+from .write_queue import WriteBehindQueue, WriteConflict, WriteFailed
 
 
 def get_connector():
@@ -20,29 +32,145 @@ class ConfluenceConnector(ConnectorModel):
         self.username = None
         self.password = None
         self.current_user = None
-        self.system_info = None
+        self.user_ready = threading.Event()
+        self.headless = False
+        self.pool = WorkerPool(self.BULK_WORKERS)
+        self.download_pool = WorkerPool(self.DOWNLOAD_WORKERS)
+        self.export_pool = WorkerPool(self.EXPORT_WORKERS)
+        self.revisions = RevisionStore(self.REVISION_DIR)
+        self.feed = FeedState(self.FEED_FILE)
+        self.feed_items = OrderedDict()
+        self.feed_lock = threading.Lock()
+        self.feed_stop = None
+        self.references = OrderedDict()
+        self.page_links = {}
+        self.attachments = {}
+        self.prefetch_enabled = True
+        self.prefetched = {}
+        self.prefetch_stats = { "requests": 0, "bytes": 0, "hits": 0, "wasted": 0 }
+        self.prefetch_lock = threading.Lock()
+        self.scheduler = RequestScheduler(self.REQUEST_RATE, self.REQUEST_BURST, self.MAX_CONCURRENCY)
+        self.session = None
+        self.http_fixture = None
+        self.http_mode = None
+        self.pages = OrderedDict()
+        self.relations = {}
+        self.spaces = {}
+        self.cql_cache = OrderedDict()
+        self.cql_lock = threading.Lock()
+        self.table_index = None
+        self.table_cursor = None
+        self.page_spaces = {}
+        self.comments = {}
+        self.notices = []
+        self.peers = {}
+        self.write_behind = False
+        self.write_queue = WriteBehindQueue(self.JOURNAL_FILE)
+        self.write_queue.register("update_page", self.send_page_update)
+        self.write_queue.register("add_comment", self.send_comment)
+        self.write_queue.register("toggle_relation", self.send_relation_toggle)
+        self.write_queue.register("toggle_watch", self.send_watch_toggle)
 
-    def connect(self, url, username, password):
+    def connect(self, url, username, password, cache=None):
         try:
             self.url = re.findall(r'.*.atlassian.net', url)[0]
             self.username = username
             self.password = password
+            self.session = self.get_session()
+            self.session.auth = (username, password)
             self.confluence = Confluence(
                 url=self.url,
                 username=username,
-                password=password
+                password=password,
+                session=self.session
             )
             self.name = f'Confluence ({url})'
-            self.current_user = self.confluence_get(f'{self.url}/wiki/rest/api/user/current')
-            self.system_info = self.confluence_get(f'{self.url}/wiki/rest/api/settings/systemInfo')
-            print(f'Connected to {self.name}')
-            print(f'Logged in as user: {self.current_user["displayName"]} ({self.current_user["accountId"]})')
+            self.current_user = None
+            self.user_ready = threading.Event()
+            cached = bool(cache and cache.get("current_user"))
+            if cached:
+                self.current_user = cache["current_user"]
+                self.user_ready.set()
+            if self.http_mode or self.headless:
+                # Recorded and replayed runs must make their requests in the same order, and
+                # commands run without prompting must not run against a failed login
+                valid = self.validate(cached)
+                # Shown now with the other connection messages, instead of after the first command's output
+                notices = self.get_notices()
+                if notices:
+                    print("\n".join(notices))
+                if not valid:
+                    return False
+            else:
+                # The login is checked in the background so the prompt is available at once
+                threading.Thread(target=self.validate, args=(cached,), daemon=True).start()
+            print(f'Connecting to {self.name}')
+            resumed = self.write_queue.open(self.url, self.notify)
+            if resumed:
+                print(f'INFO: Sending {resumed} queued change(s) from a previous session in the background')
             return True
         except:
             print(f'Could not connect to {self.name}')
             return False
 
     EDITABLE = "editable-by-reveal"
+    BULK_WORKERS = 4
+    REQUEST_RATE = 10
+    REQUEST_BURST = 20
+    MAX_CONCURRENCY = 8
+    PAGE_STATE_SIZE = 20
+    JOURNAL_FILE = os.path.join(STATE_DIR, "journal.jsonl")
+    UNSAVED_DIR = os.path.join(STATE_DIR, "unsaved")
+    DOWNLOAD_DIR = os.path.join(STATE_DIR, "downloads")
+    DOWNLOAD_WORKERS = 3
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    EXPORT_DIR = os.path.join(STATE_DIR, "export")
+    REVISION_DIR = os.path.join(STATE_DIR, "revisions")
+    FEED_FILE = os.path.join(STATE_DIR, "feed.json")
+    FEED_CQL = "(watcher = currentUser() or space in favouriteSpaces()) and type in (page, blogpost)"
+    FEED_LIMIT = 50
+    FEED_PAGES = 4
+    FEED_INTERVAL = 60
+    FEED_MAX_INTERVAL = 15 * 60
+    FEED_MAX_LOOK_BACK = 7 * 24 * 3600
+    REFERENCE_LIMIT = 100
+    REFERENCE_CACHE_SIZE = 500
+    REFERENCE_TTL = 300
+    EXPORT_WORKERS = 4
+    EXPORT_BATCH = 50
+    SITE_TIMEOUT = 10
+    SPACE_TTL = 3600
+    # Seconds a search result is shown without asking the server again, unless the query sets its own ttl
+    CQL_TTL = 30
+    CQL_CACHE_SIZE = 50
+    TABLE_ROWS = 20
+    TABLE_ROWS_MAX = 100
+    PREFETCH_BUDGET = 5 * 1024 * 1024
+    PREFETCH_TTL = 60
+    PREFETCH_PAGE_FUNCTIONS = ["show_page", "view_page", "edit_page", "show_page_info", "list_children_pages"]
+    # Most requests and bytes each command may use, checked with reveal.py --budget
+    BUDGETS = {
+        "show_page": (3, 1024 * 1024),
+        "show_page_info": (1, 1024 * 1024),
+        "list_children_pages": (1, 1024 * 1024),
+        "list_sibling_pages": (1, 1024 * 1024),
+        "toggle_relation": (2, 64 * 1024),
+        "toggle_watch": (2, 64 * 1024),
+        "list_page_comments": (1, 1024 * 1024),
+        "show_space_menu": (1, 64 * 1024),
+        "show_space_home": (1, 1024 * 1024),
+        "list_space_pages": (1, 1024 * 1024),
+        "list_page_tables": (1, 1024 * 1024),
+        "show_table": (1, 1024 * 1024),
+        "show_table_rows": (1, 1024 * 1024),
+        "show_page_changes": (3, 1024 * 1024),
+        "show_feed": (4, 1024 * 1024)
+    }
+    RELATION_CQL = {
+        "favourite": "favourite = currentUser()",
+        "watch": "watcher = currentUser()"
+    }
+    BULK_ACTIONS = ["favourite", "unfavourite", "like", "unlike", "watch", "unwatch", "label", "unlabel"]
 
     MENU = {
         "main": {
@@ -50,31 +178,36 @@ class ConfluenceConnector(ConnectorModel):
                 "List your recently visited pages",
                 "list_cql_results",
                 parameter="id in recentlyViewedContent(10) and type = page",
-                title="YOUR 10 MOST RECENTLY VISITED PAGES:"
+                title="YOUR 10 MOST RECENTLY VISITED PAGES:",
+                ttl=60
             ),  
             "Pages updated recently": Instruction(
                 "List the most recently updated pages",
                 "list_cql_results",
                 parameter='lastModified > startOfDay("-1y") and type = page order by lastModified desc',
-                title="THE 25 MOST RECENTLY EDITED PAGES:"
+                title="THE 25 MOST RECENTLY EDITED PAGES:",
+                ttl=120
             ),  
             "Favourite pages": Instruction(
                 "List your favourited pages",
                 "list_cql_results",
                 parameter="favourite = currentUser() and type = page",
-                title="YOUR FAVOURITED PAGES:"
+                title="YOUR FAVOURITED PAGES:",
+                ttl=3600
             ),  
             "Spaces visited recently": Instruction(
                 "List your recently visited spaces",
                 "list_cql_results",
                 parameter="space in recentlyViewedSpaces(10) and type = space",
-                title="YOUR 10 MOST RECENTLY VISITED SPACES:"
+                title="YOUR 10 MOST RECENTLY VISITED SPACES:",
+                ttl=300
             ),  
             "Favourite spaces": Instruction(
                 "List your favourited pages",
                 "list_cql_results",
                 parameter="space IN favouriteSpaces() and type = space",
-                title="YOUR FAVOURITED SPACES:"
+                title="YOUR FAVOURITED SPACES:",
+                ttl=3600
             ),
             "All Spaces": Instruction(
                 "List all spaces you have access to",
@@ -94,6 +227,31 @@ class ConfluenceConnector(ConnectorModel):
                 "Search for pages using Confluence Query Language (CQL)",
                 "list_cql_results",
                 parameterized="CQL query"
+            ),
+            "bulk": Instruction(
+                "Apply favourite, like, watch or label (or un-) to listed options, e.g. bulk watch 1-20",
+                "bulk_action",
+                parameterized="action [label] selection|all|tree",
+                history=False,
+                selection=True
+            ),
+            "queue": Instruction(
+                "Show changes waiting to be sent, or switch background saving (write-behind) on or off",
+                "manage_write_queue",
+                parameterized="on|off",
+                history=False
+            ),
+            "prefetch": Instruction(
+                "Show how well loading your likely next page in advance works, or switch it on or off",
+                "manage_prefetch",
+                parameterized="on|off",
+                history=False
+            ),
+            "feed": Instruction(
+                "List changes to pages you watch or in your favourite spaces, or switch checking in the background on or off",
+                "show_feed",
+                parameterized="on|off",
+                history=False
             )
         },
         "space": {
@@ -118,6 +276,13 @@ class ConfluenceConnector(ConnectorModel):
                 "space",
                 parameter="favourite",
                 history=False
+            ),
+            "export":  Instruction(
+                "Export all pages of the space to a directory of plain text files",
+                "export_pages",
+                "space",
+                parameterized="directory",
+                history=False
             )
         },
         "page": {
@@ -190,6 +355,94 @@ class ConfluenceConnector(ConnectorModel):
                 "toggle_watch",
                 "page",
                 history=False
+            ),
+            "attachments":  Instruction(
+                "List the attachments of the current page",
+                "list_page_attachments",
+                "page"
+            ),
+            "download":  Instruction(
+                "Download one or more attachments of the current page, e.g. download 2 or download 1-3",
+                "download_attachments",
+                "page",
+                parameterized="number(s)|all",
+                history=False
+            ),
+            "export":  Instruction(
+                "Export the current page and all pages below it to a directory of plain text files",
+                "export_pages",
+                "page",
+                parameterized="directory",
+                history=False
+            ),
+            "changes":  Instruction(
+                "List what changed since the version of the page you last read, or since a given version",
+                "show_page_changes",
+                "page",
+                parameterized="version",
+                history=False
+            ),
+            "links":  Instruction(
+                "List the pages the current page links to or includes, or open one, e.g. links 3",
+                "list_page_links",
+                "page",
+                parameterized="number",
+                history=False
+            ),
+            "tables":  Instruction(
+                "List the tables on the current page",
+                "list_page_tables",
+                "page",
+                history=False
+            ),
+            "table":  Instruction(
+                "Open a table of the current page and read its first rows, e.g. table 2",
+                "show_table",
+                "page",
+                parameterized="number",
+                history=False
+            ),
+            "row":  Instruction(
+                "Read one or more rows of the open table, e.g. row 12 or row 100-120",
+                "show_table_rows",
+                "page",
+                parameterized="number(s)",
+                history=False
+            ),
+            "column":  Instruction(
+                "Go to a column of the open table by number or header and read its cell",
+                "show_table_column",
+                "page",
+                parameterized="number|header",
+                history=False
+            ),
+            "up":  Instruction(
+                "Read the cell above in the open table",
+                "move_table_cell",
+                "page",
+                parameter="up",
+                history=False
+            ),
+            "down":  Instruction(
+                "Read the cell below in the open table",
+                "move_table_cell",
+                "page",
+                parameter="down",
+                history=False
+            ),
+            "left":  Instruction(
+                "Read the cell to the left in the open table",
+                "move_table_cell",
+                "page",
+                parameter="left",
+                history=False
+            ),
+            "right":  Instruction(
+                "Read the cell to the right in the open table",
+                "move_table_cell",
+                "page",
+                parameter="right",
+                history=False
             )
         }
     }
@@ -221,11 +474,13 @@ class ConfluenceConnector(ConnectorModel):
             print("No results found")
         return result_object
     
-    def list_cql_results(self, instruction_object, title=True):
+    def list_cql_results(self, instruction_object, title=True, federated=True):
+        if federated and self.peers:
+            return self.list_federated_results(instruction_object, title)
         result_object = Result(instruction_object.subject)
         cql = instruction_object.parameter
         try:
-            results = self.confluence.cql(cql, expand="metdata")["results"]
+            results = self.get_cached_cql_results(cql, instruction_object.ttl, instruction_object.title)
             instruction_objects = []
             if "space" in results[0]:
                 spaces = [result["space"] for result in results]
@@ -245,13 +500,89 @@ class ConfluenceConnector(ConnectorModel):
                 print(f'NO RESULTS FOUND for {instruction_object.title.replace(":", "")}')
                 print("HINT: Type . to return to previous screen")
             else:
-                print(f'!INVALID CQL QUERY: {cql}')
+                self.report_error(f'!INVALID CQL QUERY: {cql}')
                 print("HINT: Validate your query and try again")
             print("HELP: Type ? or help for the help menu")
         return result_object
     
+    def list_federated_results(self, instruction_object, title=True):
+        result_object = Result(instruction_object.subject)
+        cql = instruction_object.parameter
+        connectors = [self] + list(self.peers.values())
+        if title:
+            print(instruction_object.title or f'RESULTS FOR CQL QUERY: {cql}')
+        print(f'Searching {len(connectors)} sites. Results are listed per site as they arrive')
+        results = Queue()
+        for connector in connectors:
+            # Daemon threads, so a site that never answers cannot keep the client open
+            threading.Thread(target=connector.put_site_results, args=(cql, results, instruction_object.ttl), daemon=True).start()
+        deadline = time.monotonic() + self.SITE_TIMEOUT
+        pending = list(connectors)
+        instruction_objects = []
+        while pending:
+            try:
+                connector, site_objects = results.get(timeout=max(0, deadline - time.monotonic()))
+            except Empty:
+                slow = [connector.get_site_label() for connector in pending]
+                print(f'WARNING: No answer within {self.SITE_TIMEOUT} seconds from: {", ".join(slow)}')
+                break
+            pending.remove(connector)
+            if site_objects is None:
+                print(f'SITE {connector.get_site_label()}: invalid query or no results')
+                continue
+            print(f'SITE {connector.get_site_label()}: {len(site_objects)} results')
+            options = [site_object.description for site_object in site_objects]
+            print("\n".join(self.printer.output_options(options, start=len(instruction_objects))))
+            sys.stdout.flush()
+            instruction_objects += site_objects
+        if not instruction_objects:
+            print("No results found")
+        result_object.options_list = instruction_objects
+        return result_object
+
+    def put_site_results(self, cql, results, ttl=None):
+        try:
+            results.put((self, self.get_site_results(cql, ttl)))
+        except Exception:
+            results.put((self, None))
+
+    def get_site_results(self, cql, ttl=None):
+        results = self.get_cached_cql_results(cql, ttl)
+        if results and "space" in results[0]:
+            instruction_objects = list(self.generate_space_options_list([result["space"] for result in results]))
+        else:
+            instruction_objects = list(self.generate_page_list([result["content"] for result in results]))
+        for instruction_object in instruction_objects:
+            instruction_object.site = self.url
+            instruction_object.description = f'{instruction_object.description} [{self.get_site_label()}]'
+        return instruction_objects
+
+    def get_site(self):
+        return self.url
+
+    def get_site_label(self):
+        return self.url.replace("https://", "").replace(".atlassian.net", "")
+
+    def set_peers(self, peers):
+        self.peers = peers
+
+    def hand_over(self, site):
+        peer = self.peers.get(site)
+        if not peer:
+            return self
+        peers = { url: connector for url, connector in self.peers.items() if url != site }
+        peers[self.url] = self
+        self.peers = {}
+        peer.set_peers(peers)
+        return peer
+
     def list_all_spaces(self, instruction_object):
-        all_spaces = self.confluence.get_all_spaces(start=0, limit=500, expand=None)["results"]
+        all_spaces = []
+        while True:
+            spaces = self.confluence.get_all_spaces(start=len(all_spaces), limit=500, expand=None)["results"]
+            all_spaces += spaces
+            if len(spaces) < 500:
+                break
         all_spaces_by_type = self.generate_space_list(all_spaces)
         global_spaces = all_spaces_by_type["global"]
         print("LIST OF ALL GLOBAL SPACES (you have access to)")
@@ -275,34 +606,300 @@ class ConfluenceConnector(ConnectorModel):
     def list_space_blogs(self, instruction_object):
         instruction_object.parameter = f'space = {instruction_object.subject} and type = blogpost order by created desc'
         print(f'BLOG POSTS FOR SPACE: {instruction_object.subject}')
-        result_object = self.list_cql_results(instruction_object, False)
+        result_object = self.list_cql_results(instruction_object, False, False)
         if len(result_object.options_list) == 0:
             print("No blog posts found")
             return self.show_space_menu(instruction_object)
         return Result(instruction_object.subject, "space", result_object)
 
-    def show_page(self, instruction_object):
-        page = self.get_page_by_id(instruction_object.subject)
+    def show_page(self, instruction_object, page=None):
+        if not page:
+            page = self.get_page_by_id(instruction_object.subject)
         print(f'PAGE: {page["title"]}')
-        body = self.get_page_body(page)
-        body = self.printer.output_html2text(body)
-        body_lines = body.split("\n")
         limit = 20
+        body = ""
+        previewed = False
+        html_string, self.page_links[page["id"]] = self.get_resolved_body(page)
+        for text in self.printer.iter_html2text(html_string):
+            body += text
+            if not previewed and len(html_string) >= self.printer.parallel_threshold and body.count("\n") >= limit:
+                # Large pages render in parts, so show the first lines as soon as they are ready
+                print("\n".join(body.split("\n")[0:19]), flush=True)
+                previewed = True
+        last_read = self.remember_revision(page, body)
+        if last_read:
+            print(f'HINT: This page changed since you read version {last_read}. Type changes to see what changed')
+        tables = self.get_table_index(page)
+        if tables:
+            print(f'HINT: This page has {len(tables)} table(s). Type tables to read them cell by cell')
+        body_lines = body.split("\n")
         if len(body_lines) > limit:
             print(f'NOTE: Showing first {limit} lines outof {len(body_lines)}. ')
             if self.is_editable(page):
                 print(f'HINT: Type E or Edit to view and/or edit the entire page')
             else:
                 print(f'HINT: Type V or View to view the entire page')
-            view_body = "\n".join(body_lines[0:19])
-            print(view_body)
+            if not previewed:
+                view_body = "\n".join(body_lines[0:19])
+                print(view_body)
         else:
             print(body)
         return Result(page["id"], "page")
     
+    def remember_revision(self, page, text):
+        # The rendered text is kept, so a later diff only has to fetch the version it compares with
+        if self.has_pending_update(page["id"]):
+            # The shown version isn't confirmed by Confluence yet, so it isn't kept as that version's text
+            return None
+        version = page["version"]["number"]
+        # The hint is only given the first time a new version is read
+        last_read = None
+        if version not in self.revisions.get_read_versions(self.url, page["id"]):
+            last_read = self.revisions.get_last_read(self.url, page["id"], version)
+        self.revisions.save(self.url, page["id"], version, text)
+        self.revisions.mark_read(self.url, page["id"], version)
+        return last_read
+
+    def show_page_changes(self, instruction_object):
+        page = self.get_page_state(instruction_object.subject)
+        version = page["version"]["number"]
+        parameter = str(instruction_object.parameter or "").strip()
+        if version < 2:
+            print("INFO: This page has only one version")
+            return Result(page["id"], "page")
+        if parameter and (not parameter.isdigit() or not 1 <= int(parameter) < version):
+            self.report_error(f'ERROR: Type changes followed by a version number from 1 to {version - 1}')
+            return Result(page["id"], "page")
+        since = int(parameter) if parameter else self.revisions.get_last_read(self.url, page["id"], version)
+        if not since:
+            print(f'INFO: You haven\'t read an earlier version of this page. Type changes followed by a version number from 1 to {version - 1}')
+            return Result(page["id"], "page")
+        old_text = self.get_revision_text(page["id"], since)
+        if old_text is None:
+            self.report_error(f'ERROR: Version {since} of this page could not be loaded')
+            return Result(page["id"], "page")
+        new_text = self.revisions.load(self.url, page["id"], version)
+        if new_text is None:
+            new_text = self.printer.output_html2text(self.get_resolved_body(page)[0])
+            self.revisions.save(self.url, page["id"], version, new_text)
+        print(f'CHANGES TO PAGE: {page["title"]} FROM VERSION {since} TO {version}')
+        if "by" in page["version"] and "when" in page["version"]:
+            print(f'Version {version} by {page["version"]["by"]["displayName"]} on {self.get_date(page["version"]["when"])}')
+        changes = list(describe_changes(old_text, new_text))
+        print("\n".join(changes) if changes else "INFO: The text of the page didn't change")
+        return Result(page["id"], "page")
+
+    def get_revision_text(self, page_id, version):
+        text = self.revisions.load(self.url, page_id, version)
+        if text is None:
+            response = self.confluence_get(f'{self.url}/wiki/rest/api/content/{page_id}?status=historical&version={version}&expand=body.editor2,body.view')
+            if not response or "body" not in response:
+                return None
+            space_key = self.page_spaces.get(page_id)
+            text = self.printer.output_html2text(self.get_resolved_body(response, space_key)[0])
+            self.revisions.save(self.url, page_id, version, text)
+        return text
+
+    def get_resolved_body(self, page, space_key=None):
+        space_key = page.get("space", {}).get("key", space_key)
+        references = PageReferences(self.get_page_body(page), space_key)
+        targets = self.resolve_page_references(references.keys, references.includes)
+        included_keys = references.get_included_keys(targets)
+        if included_keys:
+            targets.update(self.resolve_page_references(included_keys, set()))
+        return references.render(targets)
+
+    def resolve_page_references(self, keys, includes):
+        # Returns the found pages by key, and None for the keys that were looked up and not found
+        targets = {}
+        missing = []
+        for key in keys:
+            reference_key = (key[0], key[1].lower())
+            target = self.get_page_reference(reference_key)
+            if target and "id" not in target:
+                targets[key] = None
+                continue
+            if target and key in includes and "body" not in target and target["id"] in self.pages:
+                target = dict(target, body=self.get_page_body(self.pages[target["id"]]))
+            if target and (key not in includes or "body" in target):
+                targets[key] = target
+            elif reference_key not in [(space_key, title.lower()) for space_key, title in missing]:
+                missing.append(key)
+        # Linked and included pages are looked up with one search, instead of a request per reference
+        missing = missing[:self.REFERENCE_LIMIT]
+        if not missing:
+            return targets
+        conditions = []
+        for space_key, title in missing:
+            title = title.replace('"', '\\"')
+            conditions.append(f'(space = "{space_key}" and title = "{title}")' if space_key else f'title = "{title}"')
+        expand = "content.space,content.body.storage" if includes.intersection(missing) else "content.space"
+        try:
+            response = self.confluence.cql(f'type in (page, blogpost) and ({" or ".join(conditions)})', limit=len(missing) * 2, expand=expand)
+        except Exception:
+            return targets
+        for result in response["results"]:
+            self.store_page_reference(result.get("content", {}))
+        # Only a complete answer shows that a page doesn't exist
+        complete = len(response["results"]) >= response.get("totalSize", len(response["results"]))
+        for key in missing:
+            target = self.get_page_reference((key[0], key[1].lower()))
+            if target and "id" in target:
+                targets[key] = target
+            elif complete:
+                self.references[(key[0], key[1].lower())] = { "indexed": time.monotonic() }
+                targets[key] = None
+        return targets
+
+    def get_page_reference(self, reference_key):
+        # Pages get created, renamed and edited, so neither a miss nor an included body is kept for long
+        reference = self.references.get(reference_key)
+        if reference and time.monotonic() - reference["indexed"] > self.REFERENCE_TTL:
+            return None
+        return reference
+
+    def store_page_reference(self, content):
+        if "id" not in content or "title" not in content:
+            return
+        reference = { "id": content["id"], "title": content["title"], "indexed": time.monotonic() }
+        if "key" in content.get("space", {}):
+            reference["space"] = content["space"]["key"]
+        if "storage" in content.get("body", {}):
+            reference["body"] = content["body"]["storage"]["value"]
+        # Stored with and without the space key, for links that leave out the space
+        for space_key in [content.get("space", {}).get("key"), ""]:
+            if space_key is None:
+                continue
+            self.references[(space_key, content["title"].lower())] = reference
+            self.references.move_to_end((space_key, content["title"].lower()))
+        while len(self.references) > self.REFERENCE_CACHE_SIZE:
+            self.references.popitem(last=False)
+
+    def list_page_links(self, instruction_object):
+        page = self.get_page_state(instruction_object.subject)
+        if page["id"] not in self.page_links:
+            self.page_links[page["id"]] = self.get_resolved_body(page)[1]
+        links = self.page_links[page["id"]]
+        if not links:
+            print("INFO: This page doesn't link to or include other pages")
+            return Result(page["id"], "page")
+        number = str(instruction_object.parameter or "").strip()
+        if number:
+            if not number.isdigit() or not 1 <= int(number) <= len(links):
+                self.report_error(f'ERROR: Type links followed by a number from 1 to {len(links)}')
+                return Result(page["id"], "page")
+            link = links[int(number)-1]
+            return self.show_page(Instruction(link["title"], "show_page", "page", subject=link["id"]))
+        print(f'LINKS ON PAGE: {page["title"]}')
+        option_rows = OptionRows("show_page", "page")
+        for link in links:
+            option_rows.append(link["title"], link["id"])
+        self.print_instruction_objects(option_rows)
+        return Result(page["id"], "page", option_rows)
+
+    def get_table_index(self, page):
+        # Tables are indexed once per page version and only parsed as far as rows are read
+        if not self.table_index or self.table_index[0] is not page:
+            self.table_index = (page, TableIndex(self.get_page_body(page)))
+        return self.table_index[1]
+
+    def get_open_table(self, instruction_object):
+        if not self.table_cursor or self.table_cursor["page"] != instruction_object.subject:
+            self.report_error("ERROR: No table is open. Type tables to list them and table followed by a number to open one")
+            return None
+        page = self.get_page_state(instruction_object.subject)
+        return self.get_table_index(page).get_table(self.table_cursor["table"])
+
+    def list_page_tables(self, instruction_object):
+        page = self.get_page_state(instruction_object.subject)
+        tables = self.get_table_index(page)
+        if not tables:
+            print("INFO: This page doesn't have tables")
+            return Result(page["id"], "page")
+        print(f'TABLES ON PAGE: {page["title"]}')
+        descriptions = []
+        for table in tables.tables:
+            columns = ", ".join(table.header) if table.header else f'{table.get_column_count()} columns'
+            descriptions.append(f'{table.get_row_count()} rows: {columns}')
+        print("\n".join(self.printer.output_options(descriptions)))
+        print("HINT: Type table followed by a number to open a table")
+        return Result(page["id"], "page")
+
+    def show_table(self, instruction_object):
+        page = self.get_page_state(instruction_object.subject)
+        number = str(instruction_object.parameter or "1").strip()
+        table = self.get_table_index(page).get_table(int(number)) if number.isdigit() else None
+        if not table:
+            self.report_error(f'ERROR: There is no table {number} on this page. Type tables to list them')
+            return Result(page["id"], "page")
+        self.table_cursor = { "page": page["id"], "table": int(number), "row": 1, "column": 1 }
+        print(f'TABLE {number}: {table.get_row_count()} rows, {table.get_column_count()} columns')
+        self.print_table_rows(table, 1, self.TABLE_ROWS)
+        print("HINT: Type row, column, up, down, left or right to move through the table")
+        return Result(page["id"], "page")
+
+    def show_table_rows(self, instruction_object):
+        table = self.get_open_table(instruction_object)
+        if table:
+            try:
+                rows = parse_selection(str(instruction_object.parameter or ""), table.get_row_count())
+            except ValueError as e:
+                self.report_error(f'ERROR: {e}')
+                return Result(instruction_object.subject, "page")
+            if not rows:
+                self.report_error(f'ERROR: Type row followed by a number from 1 to {table.get_row_count()} or a range like 10-20')
+                return Result(instruction_object.subject, "page")
+            self.table_cursor["row"] = rows[0]
+            self.print_table_rows(table, min(rows), max(rows))
+        return Result(instruction_object.subject, "page")
+
+    def print_table_rows(self, table, first, last):
+        shown = min(last, first + self.TABLE_ROWS_MAX - 1)
+        for number, row in table.iter_rows(first, shown):
+            cells = [f'{table.get_header(column)}: {cell}' for column, cell in enumerate(row, 1)]
+            print(f'Row {number}: {"; ".join(cells)}', flush=True)
+        last = min(last, table.get_row_count())
+        if shown < last:
+            print(f'NOTE: Showing rows {first} to {shown}. Type row {shown + 1}-{last} to read more')
+
+    def show_table_column(self, instruction_object):
+        table = self.get_open_table(instruction_object)
+        if table:
+            column = str(instruction_object.parameter or "").strip()
+            column = int(column) if column.isdigit() else table.find_column(column)
+            if not column or column > table.get_column_count():
+                self.report_error(f'ERROR: Type column followed by a number from 1 to {table.get_column_count()} or the start of a header')
+                return Result(instruction_object.subject, "page")
+            self.table_cursor["column"] = column
+            self.print_table_cell(table)
+        return Result(instruction_object.subject, "page")
+
+    def move_table_cell(self, instruction_object):
+        table = self.get_open_table(instruction_object)
+        if table:
+            steps = { "up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1) }
+            row_step, column_step = steps[instruction_object.parameter]
+            row = self.table_cursor["row"] + row_step
+            column = self.table_cursor["column"] + column_step
+            if 1 <= row <= table.get_row_count() and 1 <= column <= table.get_column_count():
+                self.table_cursor["row"], self.table_cursor["column"] = row, column
+            else:
+                print(f'INFO: There is no cell {instruction_object.parameter} from here')
+            self.print_table_cell(table)
+        return Result(instruction_object.subject, "page")
+
+    def print_table_cell(self, table):
+        row, column = self.table_cursor["row"], self.table_cursor["column"]
+        cells = next(table.iter_rows(row, row), (row, []))[1]
+        cell = cells[column-1] if column <= len(cells) else ""
+        print(f'{table.get_header(column)}, row {row}: {cell or "(empty)"}')
+
     def get_page_body(self, page):
-        body_type = "view" if "error fatal-render-error" in page["body"]["editor2"]["value"] else "editor2"
-        return page["body"][body_type]["value"]
+        body = page["body"]
+        if "editor2" in body and "error fatal-render-error" not in body["editor2"]["value"]:
+            return body["editor2"]["value"]
+        body_type = "view" if "view" in body else "storage"
+        return body[body_type]["value"]
 
     def edit_page(self, instruction_object):
         page = self.get_page_by_id(instruction_object.subject)
@@ -314,8 +911,8 @@ class ConfluenceConnector(ConnectorModel):
             page_before = f'TITLE={title}\n{self.printer.output_html2text(body)}'
             page_after = editor(text=page_before)
             if page_before != page_after:
-                self.process_page_update(instruction_object, page_after)
-        return self.show_page(instruction_object)
+                page = self.process_page_update(instruction_object, page_after)
+        return self.show_page(instruction_object, page)
 
     def view_page(self, instruction_object):
         page = self.get_page_by_id(instruction_object.subject)
@@ -327,25 +924,69 @@ class ConfluenceConnector(ConnectorModel):
             print("WARNING: Changes have been made to this page. Type \"save\" to keep changes made.")
             answer = input().lower()
             if answer == "save":
-                self.process_page_update(instruction_object, page_after)
-        return self.show_page(instruction_object)
+                page = self.process_page_update(instruction_object, page_after)
+        return self.show_page(instruction_object, page)
 
     def process_page_update(self, instruction_object, page_after):
         new_title = page_after.splitlines()[0].replace("TITLE=", "")
         new_body = "<br />".join(page_after.splitlines()[1:])
-        try:
-            self.confluence.update_page(
-                instruction_object.subject,
-                new_title,
-                new_body
+        page = self.get_page_state(instruction_object.subject)
+        version = page["version"]["number"]
+        if self.write_behind:
+            self.write_queue.put(
+                "update_page",
+                f'Saving page "{new_title}"',
+                page_id=instruction_object.subject,
+                type=page.get("type", "page"),
+                title=new_title,
+                body=new_body,
+                version=version
             )
+            print("INFO: Page update queued, it will be saved in the background")
+            # The version details stay until Confluence confirms the update, so the page can still be shown in full
+            return self.update_page_state(page, { "title": new_title, "version": dict(page["version"], number=version + 1) }, new_body)
+        response = self.put_page_update(instruction_object.subject, page.get("type", "page"), new_title, new_body, version)
+        if response and "version" in response and response["version"]["number"] == version + 1:
             print("INFO: Page updated successfully")
-        except:
-            print("ERROR: Failed to update page. Check permissions or page restrictions")
-        
+            return self.update_page_state(page, response, new_body)
+        if response and response.get("statusCode") == 409:
+            self.report_error("ERROR: Failed to update page. It has been changed by someone else in the meantime")
+        else:
+            self.report_error("ERROR: Failed to update page. Check permissions or page restrictions")
+        return None
+
+    def put_page_update(self, page_id, page_type, title, body, version):
+        update = {
+            "id": page_id,
+            "type": page_type,
+            "title": title,
+            "version": { "number": version + 1 },
+            "body": { "storage": { "value": body, "representation": "storage" } }
+        }
+        return self.confluence_put(f'{self.url}/wiki/rest/api/content/{page_id}', update)
+
+    def send_page_update(self, data):
+        response = self.put_page_update(data["page_id"], data["type"], data["title"], data["body"], data["version"])
+        if response and "version" in response and response["version"]["number"] == data["version"] + 1:
+            self.update_page_state(self.get_page_state(data["page_id"]), response, data["body"])
+            return f'INFO: Page "{data["title"]}" saved in the background (version {data["version"] + 1})'
+        if not response or response.get("statusCode", 500) >= 500 or response.get("statusCode") == 429:
+            raise ConnectionError("Confluence did not accept the update")
+        self.pages.pop(data["page_id"], None)
+        path = self.save_unsaved_copy(data)
+        if response.get("statusCode") == 409:
+            raise WriteConflict(f'the page has been changed by someone else. Your version is saved in {path}')
+        raise WriteFailed(f'{response.get("message", "check permissions or page restrictions")}. Your version is saved in {path}')
+
+    def save_unsaved_copy(self, data):
+        os.makedirs(self.UNSAVED_DIR, exist_ok=True)
+        path = os.path.join(self.UNSAVED_DIR, f'{data["page_id"]}-v{data["version"]}-{int(time.time())}.txt')
+        with open(path, "w", encoding="utf-8") as unsaved:
+            unsaved.write(f'TITLE={data["title"]}\n{data["body"].replace("<br />", chr(10))}')
+        return path
 
     def create_page(self, instruction_object):
-        page = self.get_page_by_id(instruction_object.subject)
+        page = self.get_page_state(instruction_object.subject)
         page_before = "TITLE=PAGE TITLE HERE\nINSERT PAGE CONTENT BELOW THIS LINE! (DO NOT REMOVE!)\n\n"
         page_after = editor(text=page_before)
         title = page_after.splitlines()[0].replace("TITLE=", "")
@@ -366,52 +1007,81 @@ class ConfluenceConnector(ConnectorModel):
                     page_id = new_page["id"]
                     instruction_object.description = title
                     instruction_object.subject = page_id
+                    labels = []
                     try:
                         self.confluence.set_page_label(page_id, self.EDITABLE)
+                        labels.append({ "label": self.EDITABLE })
                     except:
                         pass
+                    new_page["metadata"] = { "labels": { "results": labels } }
+                    page = self.update_page_state(new_page, new_page, body)
             except:
-                print("ERROR: Failed to create page. Check permissions or title conflicts")
+                self.report_error("ERROR: Failed to create page. Check permissions or title conflicts")
                 print("HINT: First create page with title only, then edit page to add content")
-        return self.show_page(instruction_object)
+        return self.show_page(instruction_object, page)
     
     def add_page_comment(self, instruction_object):
         if instruction_object.parameter:
             for question in instruction_object.parameter:
+                if self.write_behind:
+                    self.write_queue.put("add_comment", "Adding comment", page_id=instruction_object.subject, text=question.answer)
+                    print("INFO: Comment queued, it will be added in the background")
+                    self.store_comment(instruction_object.subject, None, question.answer)
+                    continue
                 try:
-                    self.confluence.add_comment(instruction_object.subject, question.answer)
-                    print("INFO: Comment added successfully!")
+                    comment = self.confluence.add_comment(instruction_object.subject, question.answer)
                 except:
-                    print("ERROR: Failed to add comment. Check your permissions")
+                    self.report_error("ERROR: Failed to add comment. Check your permissions")
+                    continue
+                print("INFO: Comment added successfully!")
+                self.store_comment(instruction_object.subject, comment, question.answer)
         else:
             return Result(
                 instruction_object.subject,
                 "page",
                 questions=[Question("Enter your comment:", mandatory=True)]
             )
+        if instruction_object.subject in self.comments:
+            return self.print_page_comments(instruction_object, self.comments[instruction_object.subject])
         return self.list_page_comments(instruction_object)
 
     
+    def send_comment(self, data):
+        try:
+            self.confluence.add_comment(data["page_id"], data["text"])
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if response is not None and response.status_code < 500 and response.status_code != 429:
+                raise WriteFailed("check your permissions")
+            raise
+        return "INFO: Comment added successfully!"
+
     def list_page_comments(self, instruction_object):
-        query = f'{self.url}/wiki/rest/api/content/{instruction_object.subject}/child/comment?expand=body.editor2,history.contributers,history'
-        response = self.confluence_get(query)
+        query = self.get_comments_query(instruction_object.subject)
+        response = self.take_prefetched(query) or self.confluence_get(query)
         if response["results"]:
-            comments = response["results"][::-1]
-            print(f'COMMENTS FOR PAGE (latest first):')
-            for comment in comments:
-                print(f'COMMENT BY {comment["history"]["createdBy"]["displayName"]} ON {self.get_date(comment["history"]["createdDate"])}:')
-                print(self.printer.output_html2text(comment["body"]["editor2"]["value"]))
-            return Result(instruction_object.subject, "page")
+            self.comments = { instruction_object.subject: response["results"] }
+            return self.print_page_comments(instruction_object, response["results"])
         else:
             print("INFO: Page doesn't have comments")
             instruction_object.parameter = instruction_object.subject
-            return self.show_page(instruction_object)
+            return self.show_page(instruction_object, self.pages.get(instruction_object.subject))
+
+    def print_page_comments(self, instruction_object, comments):
+        print(f'COMMENTS FOR PAGE (latest first):')
+        for comment in comments[::-1]:
+            print(f'COMMENT BY {comment["history"]["createdBy"]["displayName"]} ON {self.get_date(comment["history"]["createdDate"])}:')
+            print(self.printer.output_html2text(comment["body"]["editor2"]["value"]))
+        return Result(instruction_object.subject, "page")
     
     def show_page_info(self, instruction_object):
         page = self.get_page_by_id(instruction_object.subject)
         print(f'Title: {page["title"]}')
         print(f'Page ID: {page["id"]}')
         print(f'Version: {page["version"]["number"]}')
+        last_read = self.revisions.get_last_read(self.url, page["id"], page["version"]["number"])
+        if last_read:
+            print(f'Version you read before: {last_read} (type changes to see what changed since)')
         print(f'Last changed: {self.get_date(page["version"]["when"])}')
         print(f'Last changed by: {page["version"]["by"]["publicName"]} ({page["version"]["by"]["displayName"]})')
         print(f'Created on: {self.get_date(page["history"]["createdDate"])}')
@@ -429,7 +1099,7 @@ class ConfluenceConnector(ConnectorModel):
         return Result(instruction_object.subject, "page")
     
     def open_parent_page(self, instruction_object):
-        page = self.get_page_by_id(instruction_object.subject)
+        page = self.get_page_state(instruction_object.subject)
         if page["ancestors"]:
             parent_page = page["ancestors"][-1]
             instruction_object.subject = parent_page["id"]
@@ -447,10 +1117,11 @@ class ConfluenceConnector(ConnectorModel):
             return Result(instruction_object.subject, "page", page_children)
         else:
             print("INFO: This page doesn't have any children")
-        return self.show_page(instruction_object)
+        return self.show_page(instruction_object, page)
     
     def list_sibling_pages(self, instruction_object):
-        page = self.get_page_by_id(instruction_object.subject)
+        # The parent's page request lists the siblings, so the current page is taken from local state
+        page = self.get_page_state(instruction_object.subject)
         error = False
         if page["ancestors"]:
             parent_page = page["ancestors"][-1]
@@ -459,67 +1130,778 @@ class ConfluenceConnector(ConnectorModel):
             return self.list_children_pages(instruction_object, False)
         else:
             print("INFO: This page doesn't have sibling pages.")
-        return self.show_page(instruction_object)
+        return self.show_page(instruction_object, page)
         
     def toggle_relation(self, instruction_object):
         target_type = "content"
         if instruction_object.context == "space":
             target_type = instruction_object.context
-        query = f'{self.url}/wiki/rest/api/relation/{instruction_object.parameter}/from/user/current/to/{target_type}/{instruction_object.subject}'
-        result = self.confluence_get(query)
-        if "message" in result:
-            result = self.confluence_put(query)
-            if "target" in result:
-                if target_type == "space":
-                    print(f'{str(instruction_object.parameter).upper()} ADDED FOR SPACE: {self.get_space_name(result["target"])}')
-                else:
-                    print(f'{str(instruction_object.parameter).upper()} ADDED FOR PAGE: {result["target"]["title"]}')
+        data = { "relation": instruction_object.parameter, "target_type": target_type, "target": instruction_object.subject }
+        if self.write_behind:
+            self.write_queue.put("toggle_relation", f'Toggling {instruction_object.parameter}', **data)
+            print(f'INFO: {str(instruction_object.parameter).upper()} toggle queued')
         else:
-            result = self.confluence_delete(query)
-            if result.status_code == 204:
-                print(f'{str(instruction_object.parameter).upper()} REMOVED')
+            try:
+                print(self.send_relation_toggle(data))
+            except WriteFailed as e:
+                self.report_error(f'ERROR: {e}')
         if target_type == "space":
             return self.show_space_menu(instruction_object)
         else:
-            return self.show_page(instruction_object)
+            return self.show_page(instruction_object, self.pages.get(instruction_object.subject))
+
+    def send_relation_toggle(self, data):
+        relation = str(data["relation"]).upper()
+        query = self.get_relation_query(data["relation"], data["target_type"], data["target"])
+        if not self.get_relation_state(data["relation"], data["target_type"], data["target"]):
+            result = self.confluence_put(query)
+            if result and "target" in result:
+                self.set_relation_state(data["relation"], data["target_type"], data["target"], True)
+                self.forget_cql_results(data["relation"])
+                if data["target_type"] == "space":
+                    return f'{relation} ADDED FOR SPACE: {self.get_space_name(result["target"])}'
+                return f'{relation} ADDED FOR PAGE: {result["target"]["title"]}'
+        else:
+            result = self.confluence_delete(query)
+            if result is not None and result.status_code == 204:
+                self.set_relation_state(data["relation"], data["target_type"], data["target"], False)
+                self.forget_cql_results(data["relation"])
+                return f'{relation} REMOVED'
+        # The cached state may have been wrong, so look it up again next time
+        self.forget_relation_state(data["relation"], data["target_type"], data["target"])
+        raise WriteFailed(f'{relation} could not be changed')
     
     def toggle_watch(self, instruction_object):
-        query = f'{self.url}/wiki/rest/api/user/watch/content/{instruction_object.subject}'
-        if self.is_watcher(instruction_object):
+        if self.write_behind:
+            self.write_queue.put("toggle_watch", "Toggling watch", target=instruction_object.subject)
+            print("INFO: WATCH toggle queued")
+        else:
+            try:
+                print(self.send_watch_toggle({ "target": instruction_object.subject }))
+            except WriteFailed as e:
+                self.report_error(f'ERROR: {e}')
+        return self.show_page(instruction_object, self.pages.get(instruction_object.subject))
+
+    def send_watch_toggle(self, data):
+        query = self.get_watch_query("content", data["target"])
+        if self.get_relation_state("watch", "content", data["target"]):
             result = self.confluence_delete(query)
-            if result.status_code == 204:
-                print(f'WATCH REMOVED')
+            if result is not None and result.status_code == 204:
+                self.set_relation_state("watch", "content", data["target"], False)
+                self.forget_cql_results("watch")
+                return "WATCH REMOVED"
         else:
             result = self.confluence_post(query)
-            if result.status_code == 204:
-                print(f'WATCH ADDED')
-        return self.show_page(instruction_object)
+            if result is not None and result.status_code == 204:
+                self.set_relation_state("watch", "content", data["target"], True)
+                self.forget_cql_results("watch")
+                return "WATCH ADDED"
+        self.forget_relation_state("watch", "content", data["target"])
+        raise WriteFailed("WATCH could not be changed")
+
+    def manage_write_queue(self, instruction_object):
+        mode = str(instruction_object.parameter or "").lower()
+        if mode in ["on", "off"]:
+            self.write_behind = mode == "on"
+        elif mode:
+            self.report_error(f'ERROR: Unknown option "{mode}". Type queue on or queue off')
+        print(f'BACKGROUND SAVING (WRITE-BEHIND): {"ON" if self.write_behind else "OFF"}')
+        pending = list(self.write_queue.pending.values())
+        if pending:
+            print(f'{len(pending)} CHANGE(S) WAITING TO BE SENT:')
+            print("\n".join(self.printer.output_options([entry["description"] for entry in pending])))
+        else:
+            print("INFO: No changes waiting to be sent")
+        deferred = list(self.write_queue.deferred.values())
+        if deferred:
+            print(f'{len(deferred)} CHANGE(S) THAT COULD NOT BE SENT, RETRIED ON THE NEXT START:')
+            print("\n".join(self.printer.output_options([entry["description"] for entry in deferred])))
+        return Result(instruction_object.subject, instruction_object.context)
+
+    def list_page_attachments(self, instruction_object):
+        attachments = self.get_page_attachments(instruction_object.subject, True)
+        if not attachments:
+            print("INFO: This page doesn't have attachments")
+            return Result(instruction_object.subject, "page")
+        options_list = self.generate_attachment_list(instruction_object.subject, attachments)
+        print(f'ATTACHMENTS OF PAGE ({len(attachments)}):')
+        self.print_instruction_objects(options_list)
+        print("HINT: Type the number of an attachment, or download <numbers> to download several at once")
+        return Result(instruction_object.subject, "page", options_list)
+
+    def download_attachments(self, instruction_object):
+        attachments = self.get_page_attachments(instruction_object.subject)
+        result_object = Result(instruction_object.subject, "page", self.generate_attachment_list(instruction_object.subject, attachments))
+        if not attachments:
+            print("INFO: This page doesn't have attachments")
+            return result_object
+        try:
+            selected = [attachments[n-1] for n in parse_selection(instruction_object.parameter, len(attachments))]
+        except ValueError as e:
+            self.report_error(f'ERROR: {e}')
+            return result_object
+        if not selected:
+            self.report_error("ERROR: Please enter the number(s) of the attachment(s) to download, e.g. download 1-3")
+            return result_object
+        total = len(selected)
+        succeeded = 0
+        print(f'DOWNLOADING {total} ATTACHMENT(S) TO: {os.path.abspath(self.DOWNLOAD_DIR)}', flush=True)
+        for done, (attachment, path, error) in enumerate(self.download_pool.run(self.download_attachment, selected), 1):
+            if error:
+                print(f'[{done}/{total}] FAILED: {attachment["title"]} ({error})', flush=True)
+            else:
+                succeeded += 1
+                print(f'[{done}/{total}] DOWNLOADED: {path}', flush=True)
+        print(f'DOWNLOAD DONE: {succeeded} succeeded, {total - succeeded} failed')
+        return result_object
+
+    def get_download_path(self, attachment):
+        # Attachments of different pages can have the same name, and a new version is a new file
+        stem, extension = os.path.splitext(self.get_file_name(attachment["title"]))
+        version = attachment.get("version", {}).get("number")
+        return os.path.join(self.DOWNLOAD_DIR, f'{stem} ({attachment["id"]}{f" v{version}" if version else ""}){extension}')
+
+    def download_attachment(self, attachment):
+        os.makedirs(self.DOWNLOAD_DIR, exist_ok=True)
+        path = self.get_download_path(attachment)
+        size = attachment.get("extensions", {}).get("fileSize")
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            return path
+        part = f'{path}.part'
+        validator_file = f'{part}.validator'
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {}
+        if offset and os.path.exists(validator_file):
+            with open(validator_file, encoding="utf-8") as file:
+                validator = file.read().strip()
+            # If-Range makes the server send the whole file again when it changed since the part was saved
+            headers = { "Range": f'bytes={offset}-', "If-Range": validator }
+        else:
+            offset = 0
+        with self.session.get(f'{self.url}/wiki{attachment["_links"]["download"]}', headers=headers, stream=True) as response:
+            if response.status_code != 416:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    offset = 0
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    if validator:
+                        with open(validator_file, "w", encoding="utf-8") as file:
+                            file.write(validator)
+                    elif os.path.exists(validator_file):
+                        os.remove(validator_file)
+                with open(part, "ab" if offset else "wb") as file:
+                    for chunk in response.iter_content(self.DOWNLOAD_CHUNK_SIZE):
+                        file.write(chunk)
+        os.replace(part, path)
+        if os.path.exists(validator_file):
+            os.remove(validator_file)
+        return path
+
+    def export_pages(self, instruction_object):
+        if instruction_object.context == "space":
+            cql = f'space = "{instruction_object.subject}" and type = page'
+        else:
+            cql = f'(id = {instruction_object.subject} or ancestor = {instruction_object.subject}) and type = page'
+        directory = instruction_object.parameter or os.path.join(self.EXPORT_DIR, self.get_file_name(instruction_object.subject))
+        os.makedirs(directory, exist_ok=True)
+        manifest_file = os.path.join(directory, ".export.json")
+        manifest = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, encoding="utf-8") as file:
+                manifest = json.load(file)
+        pages = [result["content"] for result in self.get_cql_results(cql, expand="content.version")]
+        changed = []
+        for page in pages:
+            exported = manifest.get(page["id"])
+            if not exported or exported["version"] != page["version"]["number"] or not os.path.exists(os.path.join(directory, exported["file"])):
+                changed.append(page)
+        total = len(changed)
+        print(f'EXPORTING {total} OF {len(pages)} PAGES TO: {os.path.abspath(directory)}', flush=True)
+        if len(pages) > total:
+            print(f'INFO: Skipping {len(pages) - total} pages that have not changed since the last export', flush=True)
+        succeeded = 0
+        for done, (page, text, error) in enumerate(self.render_export_pages(changed), 1):
+            if error:
+                print(f'[{done}/{total}] FAILED: {page["title"]} ({error})', flush=True)
+                continue
+            file_name = f'{self.get_file_name(page["title"])} ({page["id"]}).txt'
+            with open(os.path.join(directory, file_name), "w", encoding="utf-8") as file:
+                file.write(f'TITLE: {page["title"]}\n\n{text}')
+            previous = manifest.get(page["id"])
+            if previous and previous["file"] != file_name and os.path.exists(os.path.join(directory, previous["file"])):
+                os.remove(os.path.join(directory, previous["file"]))
+            manifest[page["id"]] = { "version": page["version"]["number"], "file": file_name }
+            succeeded += 1
+            if done % self.EXPORT_BATCH == 0:
+                print(f'[{done}/{total}] exported', flush=True)
+                self.save_json(manifest_file, manifest)
+        self.save_json(manifest_file, manifest)
+        print(f'EXPORT DONE: {succeeded} exported, {total - succeeded} failed, {len(pages) - total} unchanged')
+        return Result(instruction_object.subject, instruction_object.context)
+
+    def render_export_pages(self, pages):
+        rendering = {}
+        for start in range(0, len(pages), self.EXPORT_BATCH):
+            fetched = list(self.export_pool.run(self.get_export_page, pages[start:start + self.EXPORT_BATCH]))
+            yield from self.collect_rendered_pages(rendering)
+            rendering = {}
+            for page, full_page, error in fetched:
+                if error or not full_page or "body" not in full_page:
+                    yield page, None, error or "page could not be fetched"
+                else:
+                    rendering[self.printer.submit_html2text(self.get_page_body(full_page))] = full_page
+        yield from self.collect_rendered_pages(rendering)
+
+    def collect_rendered_pages(self, rendering):
+        for future in as_completed(rendering):
+            try:
+                yield rendering[future], future.result(), None
+            except Exception as e:
+                yield rendering[future], None, e
+
+    def get_export_page(self, page):
+        return self.confluence_get(f'{self.url}/wiki/rest/api/content/{page["id"]}?expand=version,body.editor2,body.view')
+
+    def save_json(self, path, data):
+        with open(f'{path}.tmp', "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(f'{path}.tmp', path)
+
+    def manage_prefetch(self, instruction_object):
+        mode = str(instruction_object.parameter or "").lower()
+        if mode in ["on", "off"]:
+            self.prefetch_enabled = mode == "on"
+        elif mode:
+            self.report_error(f'ERROR: Unknown option "{mode}". Type prefetch on or prefetch off')
+        stats = self.prefetch_stats
+        status = "ON" if self.prefetch_enabled else "OFF"
+        if self.scheduler.is_throttled():
+            status += " (paused, Confluence is limiting requests)"
+        elif stats["bytes"] >= self.PREFETCH_BUDGET:
+            status += " (paused, budget for this session used)"
+        print(f'LOADING LIKELY NEXT PAGES IN ADVANCE: {status}')
+        print(f'Requests made in advance: {stats["requests"]} ({stats["bytes"] // 1024} KB of {self.PREFETCH_BUDGET // 1024} KB)')
+        print(f'Used (hits): {stats["hits"]}')
+        print(f'Unused (misses): {stats["wasted"]}')
+        if stats["requests"]:
+            print(f'Hit rate: {stats["hits"] * 100 // stats["requests"]}%')
+        return Result(instruction_object.subject, instruction_object.context)
+
+    def show_feed(self, instruction_object):
+        mode = str(instruction_object.parameter or "").lower()
+        if mode in ["on", "off"]:
+            self.set_feed_polling(mode == "on")
+            return Result(instruction_object.subject, instruction_object.context)
+        elif mode:
+            self.report_error(f'ERROR: Unknown option "{mode}". Type feed, feed on or feed off')
+            return Result(instruction_object.subject, instruction_object.context)
+        try:
+            self.check_feed()
+        except Exception as e:
+            print(f'WARNING: Could not check for changes ({e})')
+        with self.feed_lock:
+            items, self.feed_items = list(self.feed_items.values()), OrderedDict()
+        if not items:
+            print("INFO: No changes to pages you watch or in your favourite spaces since you last looked")
+            return Result(instruction_object.subject, instruction_object.context)
+        print(f'CHANGED PAGES ({len(items)}), MOST RECENT FIRST:')
+        option_rows = OptionRows("show_page", "page")
+        for item in sorted(items, key=lambda item: item["when"], reverse=True):
+            option_rows.append(item["description"], item["id"])
+        self.print_instruction_objects(option_rows)
+        return Result(instruction_object.subject, instruction_object.context, option_rows)
+
+    def check_feed(self):
+        # One query covers watched pages and favourite spaces, and only asks for changes since the last check
+        started = time.time()
+        checked = self.feed.get_checked(self.url)
+        minutes = int(min(started - checked, self.FEED_MAX_LOOK_BACK) // 60) + 1
+        # Oldest first, so when there are more changes than are read at once, the next check continues after them
+        cql = f'{self.FEED_CQL} and lastModified >= now("-{minutes}m") order by lastModified asc'
+        results = []
+        for n in range(self.FEED_PAGES):
+            response = self.confluence.cql(cql, start=len(results), limit=self.FEED_LIMIT, expand="content.version")["results"]
+            results += response
+            if len(response) < self.FEED_LIMIT:
+                break
+        else:
+            started = max(checked, self.get_timestamp(results[-1].get("lastModified", "")) or checked)
+        account_id = self.get_current_user().get("accountId")
+        versions = {}
+        found = 0
+        for result in results:
+            content = result.get("content", {})
+            version = content.get("version", {})
+            number = version.get("number", 0)
+            if "id" not in content or self.feed.is_seen(self.url, content["id"], number):
+                continue
+            versions[content["id"]] = number
+            cached = self.pages.get(content["id"])
+            # Versions already open in this session and your own edits are not news
+            if cached and cached["version"]["number"] >= number:
+                continue
+            if account_id and version.get("by", {}).get("accountId") == account_id:
+                continue
+            by = version.get("by", {}).get("displayName", "unknown")
+            when = version.get("when", result.get("lastModified", ""))
+            with self.feed_lock:
+                self.feed_items[content["id"]] = {
+                    "id": content["id"],
+                    "when": when,
+                    "description": f'{content["title"]} (version {number} by {by}, {self.get_date(when) if when else "unknown date"})'
+                }
+                self.feed_items.move_to_end(content["id"])
+            found += 1
+        self.feed.update(self.url, started, versions)
+        return found
+
+    def set_feed_polling(self, enabled):
+        if enabled and self.http_fixture:
+            print("WARNING: Checking in the background is not available while recording or replaying")
+        elif enabled and not self.feed_stop:
+            self.feed_stop = threading.Event()
+            threading.Thread(target=self.poll_feed, args=(self.feed_stop,), daemon=True).start()
+        elif not enabled and self.feed_stop:
+            self.feed_stop.set()
+            self.feed_stop = None
+        print(f'CHECKING FOR CHANGES IN THE BACKGROUND: {"ON" if self.feed_stop else "OFF"}')
+
+    def poll_feed(self, stop):
+        interval = self.FEED_INTERVAL
+        # Random spread keeps the clients of a team from checking at the same moment
+        while not stop.wait(interval * random.uniform(0.8, 1.2)):
+            if self.scheduler.is_throttled() or not self.scheduler.has_spare_capacity():
+                interval = min(interval * 2, self.FEED_MAX_INTERVAL)
+                continue
+            try:
+                found = self.check_feed()
+            except Exception:
+                found = 0
+            if found:
+                with self.feed_lock:
+                    count = len(self.feed_items)
+                self.notify(f'FEED: {count} changed page(s) you watch or follow. Type feed to list them')
+                interval = self.FEED_INTERVAL
+            else:
+                # A quiet site is checked less and less often
+                interval = min(interval * 2, self.FEED_MAX_INTERVAL)
+
+    def bulk_action(self, instruction_object):
+        result_object = Result(instruction_object.subject, instruction_object.context, instruction_object.options_list)
+        arguments = str(instruction_object.parameter or "").split(" ")
+        action = arguments[0].lower()
+        label = None
+        if action not in self.BULK_ACTIONS:
+            self.report_error(f'ERROR: Unknown bulk action "{action}". Use one of: {", ".join(self.BULK_ACTIONS)}')
+            print("HINT: For example: bulk watch 1-20, bulk label mylabel 1,3,5 or bulk favourite all")
+            return result_object
+        if action.endswith("label"):
+            if len(arguments) < 2:
+                self.report_error(f'ERROR: Please enter the label to {action}, e.g. bulk {action} mylabel 1-5')
+                return result_object
+            label = arguments[1]
+            arguments = arguments[1:]
+        selection = "".join(arguments[1:])
+        try:
+            options = self.get_bulk_selection(instruction_object, selection)
+        except ValueError as e:
+            self.report_error(f'ERROR: {e}')
+            return result_object
+        if not options:
+            self.report_error("ERROR: Nothing selected. Type a selection like 1-20, 1,3,5, all or tree")
+            return result_object
+        total = len(options)
+        title = f'{action} {label}' if label else action
+        succeeded = 0
+        print(f'BULK {title.upper()} FOR {total} ITEMS:', flush=True)
+        if action.removeprefix("un") in self.RELATION_CQL:
+            self.load_relation_states(action.removeprefix("un"), [option.subject for option in options if option.context != "space"])
+        for done, (option, status, error) in enumerate(self.pool.run(lambda option: self.apply_bulk_action(action, label, option), options), 1):
+            if error:
+                print(f'[{done}/{total}] FAILED: {option.description} ({error})', flush=True)
+            else:
+                succeeded += 1
+                print(f'[{done}/{total}] {status}: {option.description}', flush=True)
+        print(f'BULK {title.upper()} DONE: {succeeded} succeeded, {total - succeeded} failed')
+        return result_object
+
+    def get_bulk_selection(self, instruction_object, selection):
+        if selection.lower() == "tree":
+            if instruction_object.context != "page":
+                raise ValueError("Selection tree is only available in the context of a page")
+            results = self.get_cql_results(f'ancestor = {instruction_object.subject} and type = page')
+            return self.generate_page_list([result["content"] for result in results])
+        options_list = instruction_object.options_list or []
+        return [options_list[number-1] for number in parse_selection(selection, len(options_list))]
+
+    def apply_bulk_action(self, action, label, option):
+        target_type = "space" if option.context == "space" else "content"
+        relation = action.removeprefix("un")
+        remove = action.startswith("un")
+        if relation == "label":
+            if target_type == "space":
+                raise ValueError("labels can only be applied to pages")
+            if remove:
+                self.confluence.remove_page_label(option.subject, label)
+            else:
+                self.confluence.set_page_label(option.subject, label)
+        else:
+            if self.relations.get((relation, target_type, str(option.subject))) == (not remove):
+                return f'{relation.upper()} UNCHANGED'
+            if relation == "watch":
+                query = self.get_watch_query(target_type, option.subject)
+            else:
+                query = self.get_relation_query(relation, target_type, option.subject)
+            if not remove and relation != "watch":
+                result = self.confluence_put(query)
+                if not result or "target" not in result:
+                    raise ValueError(result["message"] if result and "message" in result else "no response")
+            else:
+                result = self.confluence_delete(query) if remove else self.confluence_post(query)
+                if result is None or result.status_code not in [200, 204]:
+                    raise ValueError(f'HTTP {result.status_code}' if result is not None else "no response")
+            self.set_relation_state(relation, target_type, option.subject, not remove)
+            self.forget_cql_results(relation)
+        return f'{relation.upper()} {"REMOVED" if remove else "ADDED"}'
 
     ### SUPPORTING FUNCTIONS ###
+
+    def get_relation_query(self, relation, target_type, target):
+        return f'{self.url}/wiki/rest/api/relation/{relation}/from/user/current/to/{target_type}/{target}'
+
+    def get_watch_query(self, target_type, target):
+        return f'{self.url}/wiki/rest/api/user/watch/{target_type}/{target}'
+
+    def get_relation_state(self, relation, target_type, target):
+        key = (relation, target_type, str(target))
+        if key not in self.relations:
+            if relation == "watch":
+                response = self.session.get(self.get_watch_query(target_type, target))
+                if response.status_code != 200:
+                    raise WriteFailed(f'{relation.upper()} state could not be read (HTTP {response.status_code})')
+                self.relations[key] = bool(response.json().get("watching"))
+            else:
+                response = self.session.get(self.get_relation_query(relation, target_type, target))
+                if response.status_code not in [200, 404]:
+                    raise WriteFailed(f'{relation.upper()} state could not be read (HTTP {response.status_code})')
+                self.relations[key] = response.status_code == 200
+        return self.relations[key]
+
+    def set_relation_state(self, relation, target_type, target, state):
+        self.relations[(relation, target_type, str(target))] = state
+
+    def forget_relation_state(self, relation, target_type, target):
+        self.relations.pop((relation, target_type, str(target)), None)
+
+    def load_relation_states(self, relation, targets):
+        # One search finds which of up to 100 pages are favourited or watched, instead of a request per page
+        targets = [str(target) for target in targets if (relation, "content", str(target)) not in self.relations]
+        for start in range(0, len(targets), 100):
+            chunk = targets[start:start+100]
+            try:
+                results = self.get_cql_results(f'{self.RELATION_CQL[relation]} and id in ({",".join(chunk)})')
+            except Exception:
+                continue
+            found = { str(result["content"]["id"]) for result in results if "content" in result }
+            for target in chunk:
+                self.set_relation_state(relation, "content", target, target in found)
+
+    def get_cached_cql_results(self, cql, ttl=None, title=None):
+        # A cached result is returned at once; once older than its TTL it is refreshed in the background
+        ttl = self.CQL_TTL if ttl is None else ttl
+        key = (self.url, self.normalise_cql(cql))
+        with self.cql_lock:
+            cached = self.cql_cache.get(key)
+            if cached:
+                self.cql_cache.move_to_end(key)
+                refresh = time.monotonic() - cached["fetched"] >= ttl and not cached["refreshing"]
+                cached["refreshing"] = cached["refreshing"] or refresh
+        if cached and not self.http_fixture:
+            if refresh:
+                threading.Thread(target=self.refresh_cql_results, args=(key, cql, title), daemon=True).start()
+            return cached["results"]
+        if cached and not refresh:
+            return cached["results"]
+        results = self.confluence.cql(cql, expand="metdata")["results"]
+        self.store_cql_results(key, results)
+        return results
+
+    def refresh_cql_results(self, key, cql, title):
+        try:
+            results = self.confluence.cql(cql, expand="metdata")["results"]
+        except Exception:
+            results = None
+        with self.cql_lock:
+            cached = self.cql_cache.get(key)
+            if cached:
+                cached["refreshing"] = False
+        # A toggle may have dropped the entry meanwhile, and then this answer could already be out of date
+        if results is None or not cached:
+            return
+        self.store_cql_results(key, results)
+        if self.get_cql_result_keys(results) != self.get_cql_result_keys(cached["results"]):
+            label = str(title or f'RESULTS FOR CQL QUERY: {cql}').rstrip(": ")
+            self.notify(f'UPDATED: {label} has changed since it was shown. Open it again to see the new list')
+
+    def store_cql_results(self, key, results):
+        with self.cql_lock:
+            self.cql_cache[key] = { "results": results, "fetched": time.monotonic(), "refreshing": False }
+            self.cql_cache.move_to_end(key)
+            while len(self.cql_cache) > self.CQL_CACHE_SIZE:
+                self.cql_cache.popitem(last=False)
+
+    def forget_cql_results(self, relation):
+        # Queries such as favourite = currentUser() or favouriteSpaces() change when a relation is toggled
+        with self.cql_lock:
+            for key in [key for key in self.cql_cache if relation in key[1].lower()]:
+                del self.cql_cache[key]
+
+    def normalise_cql(self, cql):
+        parts = re.split(r'("[^"]*"|\'[^\']*\')', str(cql).strip())
+        for n in range(0, len(parts), 2):
+            parts[n] = re.sub(r'\s*([=~<>!(),]+)\s*', r'\1', " ".join(parts[n].split()))
+        return "".join(parts)
+
+    def get_cql_result_keys(self, results):
+        return [(result.get("url"), result.get("title"), result.get("lastModified")) for result in results]
+
+    def get_cql_results(self, cql, limit=100, expand=None):
+        results = []
+        start = 0
+        while True:
+            response = self.confluence.cql(cql, start=start, limit=limit, expand=expand)
+            results += response["results"]
+            start += len(response["results"])
+            if not response["results"] or start >= response.get("totalSize", start):
+                break
+        return results
     
     def get_page_by_id(self, page_id):
-        query = f'{self.url}/wiki/rest/api/content/{page_id}?expand=history,space,version,childTypes.all,children.page,ancestors,body.editor2,body.view,metadata.currentuser,metadata.labels&trigger=viewed'
-        response = self.confluence_get(query)
-        return response
+        if page_id in self.pages and self.has_pending_update(page_id):
+            return self.pages[page_id]
+        response = self.take_prefetched(self.get_page_query(page_id))
+        if response:
+            # The prefetch didn't count as a view, so record it now for "Pages visited recently"
+            threading.Thread(target=self.mark_viewed, args=(page_id,), daemon=True).start()
+        else:
+            response = self.confluence_get(f'{self.get_page_query(page_id)}&trigger=viewed')
+        if not response or "id" not in response:
+            message = response.get("message", "not found") if response else "no response"
+            raise LookupError(f'Page {page_id} could not be loaded ({message})')
+        return self.store_page(response)
+
+    def get_page_query(self, page_id):
+        return f'{self.url}/wiki/rest/api/content/{page_id}?expand=history,space,version,childTypes.all,children.page,ancestors,body.editor2,body.view,metadata.currentuser,metadata.labels'
+
+    def get_comments_query(self, page_id):
+        return f'{self.url}/wiki/rest/api/content/{page_id}/child/comment?expand=body.editor2,history.contributers,history'
+
+    def prefetch(self, instruction_object):
+        if instruction_object.site and instruction_object.site != self.url:
+            return
+        if instruction_object.function in ["toggle_relation", "toggle_watch"]:
+            relation = "watch" if instruction_object.function == "toggle_watch" else instruction_object.parameter
+            target_type = "space" if instruction_object.context == "space" else "content"
+            if (relation, target_type, str(instruction_object.subject)) not in self.relations and self.prefetch_enabled and self.scheduler.has_spare_capacity():
+                # A likely toggle then needs only the change itself
+                self.get_relation_state(relation, target_type, instruction_object.subject)
+            return
+        if not self.prefetch_enabled or not self.session or self.scheduler.is_throttled():
+            return
+        query = None
+        if instruction_object.function in self.PREFETCH_PAGE_FUNCTIONS:
+            query = self.get_page_query(instruction_object.subject)
+        elif instruction_object.function in ["open_parent_page", "list_sibling_pages"]:
+            page = self.pages.get(instruction_object.subject)
+            if page and page.get("ancestors"):
+                query = self.get_page_query(page["ancestors"][-1]["id"])
+        elif instruction_object.function == "list_page_comments":
+            query = self.get_comments_query(instruction_object.subject)
+        with self.prefetch_lock:
+            self.expire_prefetched()
+            if not query or query in self.prefetched or self.prefetch_stats["bytes"] >= self.PREFETCH_BUDGET:
+                return
+        if not self.scheduler.has_spare_capacity():
+            return
+        try:
+            response = self.session.get(query)
+        except Exception:
+            return
+        with self.prefetch_lock:
+            self.prefetch_stats["requests"] += 1
+            self.prefetch_stats["bytes"] += len(response.content)
+            if response.status_code == 200:
+                self.prefetched[query] = (time.monotonic(), response.json())
+
+    def mark_viewed(self, page_id):
+        try:
+            self.session.get(f'{self.url}/wiki/rest/api/content/{page_id}?trigger=viewed')
+        except Exception:
+            pass
+
+    def revalidate(self, instruction_object, result_object):
+        # A resumed screen is shown from its saved copy, so its data is fetched again and compared
+        if instruction_object.local or (instruction_object.site and instruction_object.site != self.url):
+            return
+        shown = [str(option.subject) for option in result_object.options_list] if result_object and result_object.options_list else []
+        label = str(instruction_object.title or instruction_object.description).rstrip(": ")
+        if instruction_object.function == "list_cql_results" and instruction_object.parameter:
+            results = self.confluence.cql(instruction_object.parameter, expand="metdata")["results"]
+            self.store_cql_results((self.url, self.normalise_cql(instruction_object.parameter)), results)
+            current = [str(result["space"]["key"] if "space" in result else result.get("content", {}).get("id")) for result in results]
+            changed = current != shown
+        elif str(instruction_object.subject).isdigit() and instruction_object.context == "page":
+            query = self.get_page_query(instruction_object.subject)
+            response = self.session.get(query)
+            if response.status_code != 200:
+                return
+            page = response.json()
+            # Kept like a prefetched page, so opening it again doesn't wait for it
+            with self.prefetch_lock:
+                self.prefetched[query] = (time.monotonic(), page)
+            read = self.revisions.get_read_versions(self.url, page["id"])
+            changed = bool(read) and page["version"]["number"] > read[-1]
+            if instruction_object.function == "list_children_pages" and shown:
+                changed = changed or [str(child["id"]) for child in page["children"]["page"]["results"]] != shown
+        else:
+            return
+        if changed:
+            self.notify(f'UPDATED: {label} has changed since it was shown. Open it again to see the new version')
+
+    def take_prefetched(self, query):
+        with self.prefetch_lock:
+            self.expire_prefetched()
+            if query in self.prefetched:
+                self.prefetch_stats["hits"] += 1
+                return self.prefetched.pop(query)[1]
+        return None
+
+    def expire_prefetched(self):
+        now = time.monotonic()
+        for query, (fetched, response) in list(self.prefetched.items()):
+            if now - fetched > self.PREFETCH_TTL:
+                del self.prefetched[query]
+                self.prefetch_stats["wasted"] += 1
+
+    def get_page_attachments(self, page_id, refresh=False):
+        if refresh or page_id not in self.attachments:
+            attachments = []
+            query = f'{self.url}/wiki/rest/api/content/{page_id}/child/attachment?start=0&limit=50&expand=version'
+            while query:
+                response = self.confluence_get(query)
+                if not response or "results" not in response:
+                    break
+                attachments += response["results"]
+                query = f'{self.url}/wiki{response["_links"]["next"]}' if "next" in response.get("_links", {}) else None
+            self.attachments = { page_id: attachments }
+        return self.attachments[page_id]
+
+    def get_file_name(self, title):
+        return re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", title).strip() or "unnamed"
+
+    def get_file_size(self, attachment):
+        size = attachment.get("extensions", {}).get("fileSize")
+        if size is None:
+            return "unknown size"
+        for unit in ["bytes", "KB", "MB"]:
+            if size < 1024:
+                return f'{size:.0f} {unit}'
+            size = size / 1024
+        return f'{size:.1f} GB'
+
+    def has_pending_update(self, page_id):
+        for entry in list(self.write_queue.pending.values()):
+            if entry["kind"] == "update_page" and entry["data"]["page_id"] == page_id:
+                return True
+        return False
+
+    def store_page(self, page):
+        if page and "currentuser" in page.get("metadata", {}):
+            favourited = page["metadata"]["currentuser"].get("favourited") or {}
+            self.set_relation_state("favourite", "content", page["id"], bool(favourited.get("isFavourite")))
+        if page and "space" in page:
+            self.index_space(page["space"])
+            self.page_spaces[page["id"]] = page["space"]["key"]
+            self.store_page_reference({ "id": page["id"], "title": page["title"], "space": page["space"] })
+        if page and "id" in page:
+            self.pages[page["id"]] = page
+            self.pages.move_to_end(page["id"])
+            while len(self.pages) > self.PAGE_STATE_SIZE:
+                self.pages.popitem(last=False)
+        return page
+
+    def get_page_state(self, page_id):
+        if page_id in self.pages:
+            return self.pages[page_id]
+        return self.get_page_by_id(page_id)
+
+    def update_page_state(self, page, response, body=None):
+        page = dict(page)
+        page["title"] = response["title"]
+        page["version"] = response["version"]
+        if "body" in response and "storage" in response["body"]:
+            body = response["body"]["storage"]["value"]
+        page["body"] = { "storage": { "value": body, "representation": "storage" } }
+        return self.store_page(page)
+
+    def store_comment(self, page_id, comment, text):
+        if page_id not in self.comments:
+            return
+        comment = comment or {}
+        history = comment.get("history", {})
+        body = comment.get("body", {}).get("storage", {}).get("value", text)
+        self.comments[page_id].append({
+            "history": {
+                "createdBy": history.get("createdBy", self.get_current_user()),
+                "createdDate": history.get("createdDate", datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+            },
+            "body": { "editor2": { "value": body } }
+        })
 
     def get_space(self, space_key):
-        return self.confluence.get_space(space_key, expand='homepage')
+        space = self.spaces.get(space_key)
+        if not space or "name" not in space or "homepage" not in space or time.monotonic() - space["indexed"] > self.SPACE_TTL:
+            space = self.index_space(self.confluence.get_space(space_key, expand='homepage'))
+        return space
 
     def get_space_home(self, space_key):
         space = self.get_space(space_key)
-        space_home_id = space["homepage"]["id"]
-        return self.get_page_by_id(space_home_id)
+        return self.get_page_by_id(space["homepage"])
+
+    def index_space(self, space):
+        if not space or "key" not in space:
+            return space
+        entry = dict(self.spaces.get(space["key"], {}))
+        for field in ["key", "name", "status", "type"]:
+            if field in space:
+                entry[field] = space[field]
+        homepage = space.get("homepage")
+        if isinstance(homepage, dict) and "id" in homepage:
+            entry["homepage"] = str(homepage["id"])
+        elif space.get("_expandable", {}).get("homepage"):
+            # Unexpanded responses still link to the homepage, and the link ends with its id
+            entry["homepage"] = space["_expandable"]["homepage"].rstrip("/").split("/")[-1]
+        entry["indexed"] = time.monotonic()
+        self.spaces[space["key"]] = entry
+        return entry
+
+    def get_page_space_key(self, page_id):
+        if page_id in self.pages:
+            return self.pages[page_id]["space"]["key"]
+        if page_id not in self.page_spaces:
+            page = self.confluence_get(f'{self.url}/wiki/rest/api/content/{page_id}?expand=space')
+            self.index_space(page["space"])
+            self.page_spaces[page_id] = page["space"]["key"]
+        return self.page_spaces[page_id]
 
     def get_space_name(self, space):
         return f'{space["name"]} ({space["key"]})'
 
     def show_space_menu(self, instruction_object):
         if instruction_object.subject.isdigit():
-            page = self.get_page_by_id(instruction_object.subject)
-            if page:
-                instruction_object.subject = page["space"]["key"]
+            instruction_object.subject = self.get_page_space_key(instruction_object.subject)
         space_name = self.get_space_name(self.get_space(instruction_object.subject))
-        menu = self.CONTEXTS["space"]
+        menu = deepcopy(self.CONTEXTS["space"])
         options_list = [*menu]
         for k,v in menu.items():
             v.subject = instruction_object.subject
@@ -530,58 +1912,45 @@ class ConfluenceConnector(ConnectorModel):
         return result_object
 
     def generate_page_list(self, pages):
-        instruction_objects = []
+        option_rows = OptionRows("show_page", "page")
         for page in pages:
+            option_rows.append(page["title"], page["id"])
+        return option_rows
+
+    def generate_attachment_list(self, page_id, attachments):
+        instruction_objects = []
+        for n, attachment in enumerate(attachments, 1):
             instruction_object = Instruction(
-                page["title"],
-                "show_page",
+                f'{attachment["title"]} ({self.get_file_size(attachment)})',
+                "download_attachments",
                 "page",
-                subject=page["id"]
+                history=False,
+                subject=page_id,
+                parameter=str(n)
             )
             instruction_objects.append(instruction_object)
         return instruction_objects
 
     def generate_space_options_list(self, spaces):
-        instruction_objects = []
+        option_rows = OptionRows("show_space_menu", "space")
         for space in spaces:
-            instruction_object = Instruction(
-                f'{space["name"]} ({space["key"]})',
-                "show_space_menu",
-                "space",
-                subject=space["key"]
-            )
-            instruction_objects.append(instruction_object)
-        return instruction_objects
+            self.index_space(space)
+            option_rows.append(f'{space["name"]} ({space["key"]})', space["key"])
+        return option_rows
     
-    def is_watcher(self, instruction_object):
-        query = f'{self.url}/wiki/rest/api/content/{instruction_object.subject}/notification/child-created'
-        response = self.confluence_get(query)
-        is_watcher = False
-        if "results" in response:
-            for result in response["results"]:
-                if result["watcher"]["accountId"] == self.current_user["accountId"]:
-                    is_watcher = True
-                    break
-        return is_watcher
-
     def generate_space_list(self, spaces, archived=False, personal=False):
-        global_spaces = []
-        archived_spaces = []
-        personal_spaces = []
+        global_spaces = OptionRows("show_space_menu", "space")
+        archived_spaces = OptionRows("show_space_menu", "space")
+        personal_spaces = OptionRows("show_space_menu", "space")
         for space in spaces:
-            instruction_object = Instruction(
-                self.get_space_name(space),
-                "show_space_menu",
-                "space",
-                subject=space["key"]
-            )
+            self.index_space(space)
             if space["status"] == "current":
                 if space["type"] == "global":
-                    global_spaces.append(instruction_object)
+                    global_spaces.append(self.get_space_name(space), space["key"])
                 elif personal and space["type"] == "personal":
-                    personal_spaces.append(instruction_object)
+                    personal_spaces.append(self.get_space_name(space), space["key"])
             elif archived:
-                archived_spaces.append(instruction_object)
+                archived_spaces.append(self.get_space_name(space), space["key"])
         result = {
             "global": global_spaces,
             "archived": archived_spaces,
@@ -614,42 +1983,107 @@ class ConfluenceConnector(ConnectorModel):
         local_date_time = datetime_from_utc_to_local(date_time)
         return local_date_time.strftime("%c")
 
+    def get_timestamp(self, date):
+        try:
+            return calendar.timegm(datetime.strptime(date.split("Z")[0].split(".")[0], "%Y-%m-%dT%H:%M:%S").timetuple())
+        except ValueError:
+            return None
+
+    def get_cache(self):
+        if not self.current_user:
+            return {}
+        return { "current_user": self.current_user }
+
+    def get_session(self):
+        if self.http_mode == "record":
+            return RecordingSession(self.scheduler, self.http_fixture)
+        if self.http_mode == "replay":
+            return ReplaySession(self.scheduler, self.http_fixture)
+        return ScheduledSession(self.scheduler)
+
+    def set_headless(self, headless):
+        self.headless = headless
+
+    def set_prefetch(self, enabled):
+        self.prefetch_enabled = enabled
+
+    def set_http_fixture(self, fixture_file, mode):
+        self.http_fixture = fixture_file
+        self.http_mode = mode
+        self.prefetch_enabled = False
+
+    def get_http_usage(self):
+        return self.session.meter.get_usage() if self.session else None
+
+    def reset_http_usage(self):
+        if self.session:
+            self.session.meter.reset()
+
+    def validate(self, cached=False):
+        try:
+            response = self.session.get(f'{self.url}/wiki/rest/api/user/current')
+        except Exception as e:
+            self.user_ready.set()
+            self.notify(f'ERROR: Could not reach {self.name} ({e})')
+            return False
+        if response.status_code != 200:
+            self.user_ready.set()
+            self.notify(f'ERROR: Could not log in to {self.name} (HTTP {response.status_code}). Type connect to log in again')
+            return False
+        self.current_user = response.json()
+        self.user_ready.set()
+        if not cached:
+            self.notify(f'Connected. Logged in as user: {self.current_user["displayName"]} ({self.current_user["accountId"]})')
+        return True
+
+    def get_current_user(self):
+        self.user_ready.wait(30)
+        return self.current_user or {}
+
+    def notify(self, message):
+        self.notices.append(message)
+
+    def get_notices(self):
+        notices, self.notices = self.notices, []
+        for peer in self.peers.values():
+            notices += [f'{peer.get_site_label()}: {notice}' for notice in peer.get_notices()]
+        return notices
+
     def print_instruction_objects(self, instruction_objects):
-        options = [instruction_object.description for instruction_object in instruction_objects]
-        print("\n".join(self.printer.output_options(options)))
+        print("\n".join(self.printer.output_option_page(instruction_objects)))
 
     def confluence_get(self, query):
         try:
-            return requests.get(query, auth=(self.username, self.password)).json()
+            return self.session.get(query).json()
         except Exception as e:
-            print(e)
+            self.report_error(f'ERROR: {e}')
             return None
 
     def confluence_delete(self, query):
         try:
-            result = requests.delete(query, auth=(self.username, self.password))
+            result = self.session.delete(query)
             return result
         except Exception as e:
-            print(e)
+            self.report_error(f'ERROR: {e}')
             return None
 
     def confluence_put(self, query, body=None):
         try:
             if body:
-                return requests.put(query, json=body, auth=(self.username, self.password)).json()
+                return self.session.put(query, json=body).json()
             else:
-                return requests.put(query, auth=(self.username, self.password)).json()
+                return self.session.put(query).json()
         except Exception as e:
-            print(e)
+            self.report_error(f'ERROR: {e}')
             return None
 
     def confluence_post(self, query, body=None):
         try:
             headers = { "X-Atlassian-Token": "no-check" }
             if body:
-                return requests.post(query, json=body, auth=(self.username, self.password))
+                return self.session.post(query, json=body)
             else:
-                return requests.post(query, headers=headers, auth=(self.username, self.password))
+                return self.session.post(query, headers=headers)
         except Exception as e:
-            print(e)
+            self.report_error(f'ERROR: {e}')
             return None
\ No newline at end of file
@@ -0,0 +1,53 @@
+import json, os, threading, time
+from os.path import dirname, exists
+
+
+class FeedState():
+
+    SEEN_SIZE = 500
+
+    def __init__(self, feed_file="feed.json", first_look_back=24 * 3600):
+        self.feed_file = feed_file
+        self.first_look_back = first_look_back
+        self.lock = threading.Lock()
+        self.sites = None
+
+    def load(self):
+        if self.sites is None:
+            self.sites = {}
+            if exists(self.feed_file):
+                try:
+                    with open(self.feed_file, encoding="utf-8") as file:
+                        self.sites = json.load(file)
+                except (OSError, ValueError):
+                    self.sites = {}
+        return self.sites
+
+    def save(self):
+        try:
+            os.makedirs(dirname(self.feed_file) or ".", exist_ok=True)
+            with open(f'{self.feed_file}.tmp', "w", encoding="utf-8") as file:
+                json.dump(self.sites, file)
+            os.replace(f'{self.feed_file}.tmp', self.feed_file)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def get_checked(self, site):
+        with self.lock:
+            return self.load().get(site, {}).get("checked", time.time() - self.first_look_back)
+
+    def is_seen(self, site, page_id, version):
+        with self.lock:
+            return self.load().get(site, {}).get("seen", {}).get(str(page_id), 0) >= version
+
+    def update(self, site, checked, versions):
+        # The high-water mark moves forward, and recent versions are kept to drop repeats near the mark
+        with self.lock:
+            state = self.load().setdefault(site, { "checked": checked, "seen": {} })
+            state["checked"] = max(state.get("checked", 0), checked)
+            seen = state.setdefault("seen", {})
+            for page_id, version in versions.items():
+                seen[str(page_id)] = max(seen.get(str(page_id), 0), version)
+            while len(seen) > self.SEEN_SIZE:
+                seen.pop(next(iter(seen)))
+            self.save()
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod, abstractproperty
 
+# Journal, session, caches and files written by the client are kept together in this directory
+STATE_DIR = "state"
 
 class Result():
      def __init__(self, subject=None, context="global", options_list=[], error=None, questions=None, answers=None):
@@ -13,7 +15,7 @@ class Result():
 
 class Instruction():
 
-    def __init__(self, description, function, context="global", history=True, subject=None, endpoint=None, parameter=None, local=False, title=None, parameterized=None):
+    def __init__(self, description, function, context="global", history=True, subject=None, endpoint=None, parameter=None, local=False, title=None, parameterized=None, selection=False, site=None, ttl=None):
         self.description = description
         self.function = function
         self.context = context
@@ -24,6 +26,10 @@ class Instruction():
         self.local = local
         self.title = title
         self.parameterized = parameterized
+        self.selection = selection
+        self.site = site
+        self.ttl = ttl
+        self.options_list = []
 
     def set_available(self, available, commands=True):
         if commands:
@@ -32,18 +38,93 @@ class Instruction():
             self.available_shortcuts = {v: k for k, v in available.items()}
 
 
+class OptionRows():
+
+    def __init__(self, function, context="global", **options):
+        self.function = function
+        self.context = context
+        self.options = options
+        self.descriptions = []
+        self.subjects = []
+
+    def append(self, description, subject):
+        self.descriptions.append(description)
+        self.subjects.append(subject)
+
+    def describe(self, start, end):
+        return self.descriptions[start:end]
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Instruction(self.descriptions[index], self.function, self.context, subject=self.subjects[index], **self.options)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
 class ConnectorModel(ABC):
     
     MENU = abstractproperty()
     CONTEXTS = abstractproperty()
     SHORTCUTS = abstractproperty()
+    BUDGETS = {}
+    error_count = 0
 
     @abstractmethod
     def test_connection(self):
         pass
 
     @abstractmethod
-    def connect(self, url, username, password):
+    def connect(self, url, username, password, cache=None):
+        pass
+
+    def get_notices(self):
+        return []
+
+    def revalidate(self, instruction_object, result_object):
+        pass
+
+    def report_error(self, message):
+        # Counted, so commands run without prompting can end with an error code
+        self.error_count += 1
+        print(message)
+
+    def get_error_count(self):
+        return self.error_count
+
+    def get_cache(self):
+        return {}
+
+    def get_site(self):
+        return None
+
+    def set_peers(self, peers):
+        pass
+
+    def hand_over(self, site):
+        return self
+
+    def set_http_fixture(self, fixture_file, mode):
+        pass
+
+    def set_prefetch(self, enabled):
+        pass
+
+    def set_headless(self, headless):
+        pass
+
+    def get_http_usage(self):
+        return None
+
+    def reset_http_usage(self):
+        pass
+
+    def prefetch(self, instruction_object):
         pass
 
 class Question():
@@ -2,9 +2,68 @@
 import html2text
 import textwrap
 import re
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+def render_html2text(html_string):
+    printer = OutputPrinter()
+    return printer.wrap_lines(printer.render_html(html_string))
+
+
+def render_html2text_chunk(html_string, strip_start, strip_end):
+    printer = OutputPrinter()
+    text = printer.get_text_maker().handle(html_string)
+    if strip_start:
+        text = text.lstrip("\n")
+    if strip_end:
+        text = text.rstrip("\n")
+    return printer.clean_text(text)
+
+
+def render_html2text_seam(before, after):
+    printer = OutputPrinter()
+    head = printer.get_text_maker().handle(before).rstrip("\n")
+    tail = printer.get_text_maker().handle(after).lstrip("\n")
+    both = printer.get_text_maker().handle(before + after)
+    if not head.strip() or not tail.strip():
+        return None
+    if len(both) < len(head) + len(tail) or not both.startswith(head) or not both.endswith(tail):
+        return None
+    return both[len(head):len(both) - len(tail)]
+
 
 class OutputPrinter():
 
+    PAGE_SIZE = 20
+    PARALLEL_THRESHOLD = 1000000
+    CHUNK_SIZE = 200000
+    BLOCK_TAGS = ["p", "div", "table", "ul", "ol", "dl", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote",
+        "hr", "section", "ac:structured-macro", "ac:macro", "ac:layout", "ac:task-list"]
+    VOID_TAGS = ["br", "hr", "img", "input", "meta", "link", "col", "area", "base", "wbr", "source", "embed", "param", "track"]
+    TAG_PATTERN = re.compile(r'<!\[CDATA\[.*?\]\]>|<!--.*?-->|<(/?)([A-Za-z][\w:.-]*)(?:"[^"]*"|\'[^\']*\'|[^\'">])*?(/?)>', re.S)
+
+    def __init__(self, max_processes=None, parallel_threshold=None, chunk_size=None):
+        self.max_processes = max_processes
+        self.parallel_threshold = parallel_threshold or self.PARALLEL_THRESHOLD
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.process_pool = None
+
+    def get_process_pool(self):
+        if not self.process_pool:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.max_processes)
+        return self.process_pool
+
+    def submit(self, function, *args):
+        try:
+            return self.get_process_pool().submit(function, *args)
+        except (OSError, NotImplementedError, RuntimeError):
+            future = Future()
+            future.set_result(function(*args))
+            return future
+
+    def submit_html2text(self, html_string):
+        return self.submit(render_html2text, html_string)
+
     def wrap_lines(self, string, max_width=80):
         if not max_width or max_width <= 0:
             return string
@@ -27,8 +86,7 @@ class OutputPrinter():
         return '\n'.join(wrapped_lines)
 
 
-    def output_html2text(self, html_string):
-        html_string = self.replace_tasks(html_string)
+    def get_text_maker(self):
         text_maker = html2text.HTML2Text()
         text_maker.single_line_break = True
         text_maker.ignore_emphasis = True
@@ -38,19 +96,110 @@ class OutputPrinter():
         text_maker.default_image_alt = "image"
         text_maker.emphasis_mark = ""
         text_maker.strong_mark = ""
-        clean_string = text_maker.handle(html_string)
+        return text_maker
+
+    def clean_text(self, clean_string):
         clean_string = clean_string.replace("* * *\n", "")
         clean_string = clean_string.replace("###", "")
         clean_string = clean_string.replace("##", "")
         clean_string = self.format_tables(clean_string)
-        clean_string = self.wrap_lines(clean_string)
         return clean_string
 
-    def output_options(self, options, max_width=80):
+    def render_html(self, html_string):
+        html_string = self.replace_tasks(html_string)
+        return self.clean_text(self.get_text_maker().handle(html_string))
+
+    def output_html2text(self, html_string):
+        if len(html_string) < self.parallel_threshold:
+            return self.wrap_lines(self.render_html(html_string))
+        return "".join(self.iter_html2text(html_string))
+
+    def iter_html2text(self, html_string):
+        if len(html_string) < self.parallel_threshold:
+            yield self.output_html2text(html_string)
+            return
+        html_string = self.replace_tasks(html_string)
+        chunks = self.split_blocks(html_string)
+        if len(chunks) < 2:
+            yield self.wrap_lines(self.render_html(html_string))
+            return
+        last = len(chunks) - 1
+        texts = []
+        seams = []
+        for n, (start, end, first_block, last_block) in enumerate(chunks):
+            texts.append(self.submit(render_html2text_chunk, html_string[start:end], n > 0, n < last))
+            if n > 0:
+                # Submitted in reading order so the first part is ready as soon as possible
+                seams.append(self.submit(render_html2text_seam, html_string[chunks[n-1][3]:chunks[n-1][1]], html_string[start:first_block]))
+        start = 0
+        text = texts[0].result()
+        pending = ""
+        separator = ""
+        for n in range(len(chunks)):
+            if n == last:
+                pending += text
+                break
+            seam = seams[n].result()
+            if seam is None:
+                # No reliable separator for this boundary, so render both chunks as one
+                text = render_html2text_chunk(html_string[start:chunks[n+1][1]], start > 0, n + 1 < last)
+                continue
+            if text.endswith("* * *") and seam.startswith("\n"):
+                text = text[:-5]
+                seam = seam[1:]
+            pending += text + seam
+            if pending.endswith("\n"):
+                yield separator + self.wrap_lines(pending)
+                separator = "\n"
+                pending = ""
+            start = chunks[n+1][0]
+            text = texts[n+1].result()
+        if pending:
+            yield separator + self.wrap_lines(pending)
+
+    def split_blocks(self, html_string):
+        chunks = []
+        depth = 0
+        start = 0
+        first_block = None
+        last_block = 0
+        chunk_size = self.chunk_size // 4
+        for match in self.TAG_PATTERN.finditer(html_string):
+            closing, tag, self_closing = match.groups()
+            if not tag:
+                continue
+            tag = tag.lower()
+            if closing:
+                depth -= 1
+                if depth < 0:
+                    return [(0, len(html_string), len(html_string), 0)]
+            elif not self_closing and tag not in self.VOID_TAGS:
+                depth += 1
+            if depth == 0 and tag in self.BLOCK_TAGS:
+                end = match.end()
+                if first_block is None:
+                    first_block = end
+                if end - start >= chunk_size:
+                    chunks.append((start, end, first_block, last_block))
+                    start = end
+                    first_block = None
+                    chunk_size = self.chunk_size
+                last_block = end
+        if depth != 0:
+            return [(0, len(html_string), len(html_string), 0)]
+        if start < len(html_string):
+            if chunks and first_block is None:
+                previous = chunks.pop()
+                chunks.append((previous[0], len(html_string), previous[2], previous[3]))
+            else:
+                chunks.append((start, len(html_string), first_block, last_block))
+        return chunks
+
+    def output_options(self, options, max_width=80, start=0):
                 
         def optionize(options_list):
-            for i,option in enumerate(options_list):
-                option_item = f'{i+1}. {option}'
+            for i,option in enumerate(options_list, start + 1):
+                option_item = f'{i}. {option}'
                 length = len(option_item)
                 if length > max_width:
                     yield textwrap.shorten(option_item, width=max_width-3, placeholder="...")
@@ -60,6 +209,25 @@ class OutputPrinter():
         options = optionize(options)
         return options
 
+    def get_page_count(self, options, page_size=None):
+        page_size = page_size or self.PAGE_SIZE
+        return max(1, -(-len(options) // page_size))
+
+    def output_option_page(self, options, page=0, page_size=None):
+        page_size = page_size or self.PAGE_SIZE
+        pages = self.get_page_count(options, page_size)
+        page = min(max(0, page), pages - 1)
+        start = page * page_size
+        end = min(len(options), start + page_size)
+        if hasattr(options, "describe"):
+            descriptions = options.describe(start, end)
+        else:
+            descriptions = [option.description for option in options[start:end]]
+        lines = list(self.output_options(descriptions, start=start))
+        if pages > 1:
+            lines.append(f'Showing {start + 1}-{end} of {len(options)} (page {page + 1} of {pages}). Type next, prev or page <n>')
+        return lines
+
     def format_tables(self, html):
         tables = re.findall(r'<table.*?>(?s:.*?)<\/table>', html)
         for table in tables:
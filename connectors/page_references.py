@@ -0,0 +1,118 @@
+import html, re
+
+
+class PageReferences():
+
+    INCLUDE_PATTERN = re.compile(r'<ac:structured-macro\b[^>]*?ac:name="(include|excerpt-include)"[^>]*>(.*?)</ac:structured-macro>', re.S)
+    LINK_PATTERN = re.compile(r'<ac:link\b[^>]*>(.*?)</ac:link>', re.S)
+    VIEW_LINK_PATTERN = re.compile(r'<a\b[^>]*?href="[^"]*(?:/pages/|pageId=)(\d+)[^"]*"[^>]*>(.*?)</a>', re.S)
+    PAGE_PATTERN = re.compile(r'<ri:(?:page|blog-post)\b([^>]*?)/?>')
+    ATTRIBUTE_PATTERN = re.compile(r'ri:([\w-]+)="([^"]*)"')
+    LINK_BODY_PATTERN = re.compile(r'<ac:(?:plain-text-)?link-body>(?:<!\[CDATA\[)?(.*?)(?:\]\]>)?</ac:(?:plain-text-)?link-body>', re.S)
+    EXCERPT_PATTERN = re.compile(r'<ac:structured-macro\b[^>]*?ac:name="excerpt"[^>]*>.*?<ac:rich-text-body>(.*?)</ac:rich-text-body>', re.S)
+    REFERENCE_PATTERN = re.compile("|".join(f'(?:{pattern.pattern})' for pattern in [INCLUDE_PATTERN, LINK_PATTERN, VIEW_LINK_PATTERN]), re.S)
+
+    def __init__(self, html_string, space_key=None):
+        self.html = html_string
+        self.space_key = space_key
+        self.keys = []
+        self.includes = set()
+        for match in self.INCLUDE_PATTERN.finditer(html_string):
+            key = self.get_key(match.group(2))
+            if key:
+                self.add_key(key)
+                self.includes.add(key)
+        for match in self.LINK_PATTERN.finditer(html_string):
+            key = self.get_key(match.group(1))
+            if key:
+                self.add_key(key)
+
+    def add_key(self, key):
+        if key not in self.keys:
+            self.keys.append(key)
+
+    def get_included_keys(self, targets):
+        # Links inside included pages are numbered too, so their pages have to be looked up as well
+        keys = []
+        for match in self.INCLUDE_PATTERN.finditer(self.html):
+            key = self.get_key(match.group(2))
+            body = self.get_included_body(match, targets.get(key) if key else None)
+            if body is not None:
+                included = PageReferences(body, targets[key].get("space", self.space_key))
+                keys += [key for key in included.keys if key not in included.includes and key not in keys]
+        return keys
+
+    def get_included_body(self, match, target):
+        if not target or target.get("body") is None:
+            return None
+        body = target["body"]
+        if match.group(1) == "excerpt-include":
+            excerpt = self.EXCERPT_PATTERN.search(body)
+            body = excerpt.group(1) if excerpt else ""
+        return body
+
+    def get_key(self, fragment):
+        match = self.PAGE_PATTERN.search(fragment)
+        if not match:
+            return None
+        attributes = dict(self.ATTRIBUTE_PATTERN.findall(match.group(1)))
+        if "content-title" not in attributes:
+            return None
+        space_key = html.unescape(attributes.get("space-key", self.space_key or ""))
+        return (space_key, html.unescape(attributes["content-title"]))
+
+    def render(self, targets):
+        # targets maps (space key, title) to {"id", "title"} and, for included pages, "body", or to None when not found
+        links = []
+        numbers = {}
+
+        def number_link(page_id, title):
+            if page_id not in numbers:
+                links.append({ "id": page_id, "title": title })
+                numbers[page_id] = len(links)
+            return numbers[page_id]
+
+        return self.replace_references(targets, number_link), links
+
+    def replace_references(self, targets, number_link, nested=False):
+
+        def replace_include(match):
+            key = self.get_key(match.group(2))
+            target = targets.get(key) if key else None
+            title = html.escape(target["title"] if target else (key or ("", "unknown page"))[1])
+            if nested:
+                # Pages included by an included page aren't shown, to keep pages from including each other endlessly
+                return f'<p>[Included page "{title}" is not shown here]</p>'
+            body = self.get_included_body(match, target)
+            if body is None:
+                return f'<p>[Included page "{title}" could not be loaded]</p>'
+            number = number_link(target["id"], target["title"])
+            body = PageReferences(body, target.get("space", self.space_key)).replace_references(targets, number_link, True)
+            return f'<p>[Included from page "{title}" [{number}]]</p>{body}<p>[End of included page "{title}"]</p>'
+
+        def replace_link(match):
+            key = self.get_key(match.group(1))
+            if not key:
+                return match.group(0)
+            body = self.LINK_BODY_PATTERN.search(match.group(1))
+            target = targets.get(key)
+            text = body.group(1).strip() if body and body.group(1).strip() else html.escape(target["title"] if target else key[1])
+            if key not in targets:
+                return f'{text} [page not looked up]'
+            if not target:
+                return f'{text} [page not found]'
+            return f'{text} [{number_link(target["id"], target["title"])}]'
+
+        def replace_view_link(match):
+            text = re.sub(r'<[^>]+>', "", match.group(2)).strip()
+            return f'{match.group(2)} [{number_link(match.group(1), html.unescape(text) or match.group(1))}]'
+
+        def replace_reference(match):
+            # One pass over the body numbers the links in reading order
+            for pattern, replace in [(self.INCLUDE_PATTERN, replace_include), (self.LINK_PATTERN, replace_link), (self.VIEW_LINK_PATTERN, replace_view_link)]:
+                reference = pattern.fullmatch(match.group(0))
+                if reference:
+                    return replace(reference)
+            return match.group(0)
+
+        return self.REFERENCE_PATTERN.sub(replace_reference, self.html)
@@ -0,0 +1,86 @@
+import base64, json, threading
+from os.path import abspath
+import requests
+from requests.structures import CaseInsensitiveDict
+from .scheduler import ScheduledSession
+
+
+SENSITIVE_HEADERS = ["set-cookie", "cookie", "authorization", "proxy-authorization", "www-authenticate"]
+
+
+fixture_locks = {}
+fixture_locks_lock = threading.Lock()
+
+
+def get_fixture_lock(fixture_file):
+    # The connectors of federated sites record to the same file
+    with fixture_locks_lock:
+        return fixture_locks.setdefault(abspath(fixture_file), threading.Lock())
+
+
+def get_request_key(method, url, params=None):
+    return f'{method.upper()} {requests.Request(method, url, params=params).prepare().url}'
+
+
+def get_safe_headers(headers):
+    # Fixtures are meant to be committed, so cookies, tokens and session ids are left out
+    safe = {}
+    for name, value in headers.items():
+        lower = name.lower()
+        if lower in SENSITIVE_HEADERS or "token" in lower or "session" in lower:
+            continue
+        safe[name] = value
+    return safe
+
+
+class RecordingSession(ScheduledSession):
+
+    def __init__(self, scheduler, fixture_file):
+        super().__init__(scheduler)
+        self.fixture_file = fixture_file
+        self.lock = get_fixture_lock(fixture_file)
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        record = {
+            "key": get_request_key(method, url, kwargs.get("params")),
+            "status": response.status_code,
+            "headers": get_safe_headers(response.headers),
+            "body": base64.b64encode(response.content).decode("ascii")
+        }
+        with self.lock:
+            with open(self.fixture_file, "a", encoding="utf-8") as fixture:
+                fixture.write(json.dumps(record) + "\n")
+        return response
+
+
+class ReplaySession(ScheduledSession):
+
+    def __init__(self, scheduler, fixture_file):
+        super().__init__(scheduler)
+        self.records = {}
+        self.lock = threading.Lock()
+        with open(fixture_file, encoding="utf-8") as fixture:
+            for line in fixture:
+                record = json.loads(line)
+                self.records.setdefault(record["key"], []).append(record)
+
+    def request(self, method, url, *args, **kwargs):
+        key = get_request_key(method, url, kwargs.get("params"))
+        with self.lock:
+            records = self.records.get(key)
+            if not records:
+                raise requests.ConnectionError(f'No recorded response for {key}')
+            # Responses are replayed in recorded order, and the last one is kept for repeated requests
+            record = records.pop(0) if len(records) > 1 else records[0]
+        response = requests.Response()
+        response.status_code = record["status"]
+        response.headers = CaseInsensitiveDict(record["headers"])
+        response.headers.pop("Content-Encoding", None)
+        response._content = base64.b64decode(record["body"])
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        response.url = key.split(" ", 1)[1]
+        response.request = requests.Request(method, response.url).prepare()
+        self.meter.add(response)
+        return response
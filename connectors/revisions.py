@@ -0,0 +1,102 @@
+import difflib, json, os, re, zlib
+from os.path import exists, join
+
+
+class RevisionStore():
+
+    def __init__(self, directory="revisions", versions=5):
+        self.directory = directory
+        self.versions = versions
+
+    def get_page_dir(self, site, page_id):
+        site = re.sub(r'\W+', "_", str(site).split("//")[-1])
+        return join(self.directory, site, str(page_id))
+
+    def save(self, site, page_id, version, text):
+        page_dir = self.get_page_dir(site, page_id)
+        path = join(page_dir, f'{version}.z')
+        if exists(path):
+            return
+        try:
+            os.makedirs(page_dir, exist_ok=True)
+            with open(f'{path}.tmp', "wb") as file:
+                file.write(zlib.compress(text.encode("utf-8"), 9))
+            os.replace(f'{path}.tmp', path)
+            # Only the newest versions of each page are kept
+            for old in self.get_versions(site, page_id)[:-self.versions]:
+                os.remove(join(page_dir, f'{old}.z'))
+        except OSError:
+            pass
+
+    def load(self, site, page_id, version):
+        path = join(self.get_page_dir(site, page_id), f'{version}.z')
+        if not exists(path):
+            return None
+        try:
+            with open(path, "rb") as file:
+                return zlib.decompress(file.read()).decode("utf-8")
+        except (OSError, zlib.error, UnicodeDecodeError):
+            return None
+
+    def get_versions(self, site, page_id):
+        page_dir = self.get_page_dir(site, page_id)
+        if not exists(page_dir):
+            return []
+        return sorted(int(name[:-2]) for name in os.listdir(page_dir) if name.endswith(".z") and name[:-2].isdigit())
+
+    def get_read_versions(self, site, page_id):
+        path = join(self.get_page_dir(site, page_id), "read.json")
+        if not exists(path):
+            return []
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def mark_read(self, site, page_id, version):
+        read = self.get_read_versions(site, page_id)
+        if version in read:
+            return
+        read = sorted(read + [version])[-self.versions:]
+        path = join(self.get_page_dir(site, page_id), "read.json")
+        try:
+            os.makedirs(self.get_page_dir(site, page_id), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(read, file)
+        except OSError:
+            pass
+
+    def get_last_read(self, site, page_id, before):
+        read = [version for version in self.get_read_versions(site, page_id) if version < before]
+        return read[-1] if read else None
+
+
+def describe_changes(old_text, new_text):
+    # Changes are spelled out in words instead of + and - markers, so they read well aloud
+    old_lines = [line.strip() for line in old_text.splitlines() if line.strip()]
+    new_numbers, new_lines = [], []
+    for number, line in enumerate(new_text.splitlines(), 1):
+        # Blank lines are left out of the comparison, but still count for the line numbers
+        if line.strip():
+            new_numbers.append(number)
+            new_lines.append(line.strip())
+    new_numbers.append(len(new_text.splitlines()) + 1)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        line_number = new_numbers[new_start]
+        if tag == "replace" and old_end - old_start == 1 and new_end - new_start == 1:
+            yield f'Changed at line {line_number}:'
+            yield f'  Was: {old_lines[old_start]}'
+            yield f'  Now: {new_lines[new_start]}'
+            continue
+        if old_end > old_start:
+            yield f'Removed {old_end - old_start} line(s) before line {line_number}:'
+            for line in old_lines[old_start:old_end]:
+                yield f'  {line}'
+        if new_end > new_start:
+            yield f'Added {new_end - new_start} line(s) at line {line_number}:'
+            for line in new_lines[new_start:new_end]:
+                yield f'  {line}'
@@ -0,0 +1,161 @@
+import random, threading, time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+
+class RequestScheduler():
+
+    IDEMPOTENT = ["GET", "HEAD", "OPTIONS"]
+    RETRY_STATUS = [502, 503, 504]
+
+    def __init__(self, rate=10, burst=20, max_concurrency=8, max_retries=5, backoff_base=0.5, backoff_max=60):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.active = 0
+        self.successes = 0
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.blocked_until = 0
+        self.throttled_count = 0
+        self.throttled_at = None
+        self.condition = threading.Condition()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.active < self.concurrency and self.tokens >= 1:
+                        self.tokens -= 1
+                        self.active += 1
+                        return
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else None
+                self.condition.wait(wait)
+
+    def release(self, throttled=False):
+        with self.condition:
+            self.active -= 1
+            if throttled:
+                self.throttled_count += 1
+                self.throttled_at = time.monotonic()
+                self.successes = 0
+                self.concurrency = max(1, self.concurrency // 2)
+            else:
+                self.successes += 1
+                if self.concurrency < self.max_concurrency and self.successes >= self.concurrency * 4:
+                    self.concurrency += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+    def is_throttled(self, window=300):
+        return self.throttled_at is not None and time.monotonic() - self.throttled_at < window
+
+    def has_spare_capacity(self):
+        with self.condition:
+            now = time.monotonic()
+            self.refill(now)
+            return now >= self.blocked_until and self.tokens >= self.burst / 2 and self.active < max(1, self.concurrency // 2)
+
+    def block(self, seconds):
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+    def get_backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get_retry_after(self, response):
+        retry_after = response.headers.get("Retry-After")
+        if not retry_after:
+            return None
+        if retry_after.strip().isdigit():
+            return int(retry_after)
+        try:
+            retry_date = parsedate_to_datetime(retry_after)
+            return max(0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def send(self, send_request, method, url, *args, **kwargs):
+        idempotent = method.upper() in self.IDEMPOTENT
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                response = send_request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.release()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                time.sleep(self.get_backoff(attempt))
+                attempt += 1
+                continue
+            throttled = response.status_code == 429
+            self.release(throttled)
+            if throttled:
+                # A throttled request was not processed, so any method may be retried
+                wait = self.get_retry_after(response)
+                if wait is None:
+                    wait = self.get_backoff(attempt)
+                # All requests pause as asked, also when this one is given up instead of retried
+                self.block(wait)
+                if attempt >= self.max_retries or wait > self.backoff_max:
+                    return response
+            elif attempt >= self.max_retries:
+                return response
+            elif idempotent and response.status_code in self.RETRY_STATUS:
+                wait = self.get_retry_after(response) or self.get_backoff(attempt)
+                if wait > self.backoff_max:
+                    return response
+                time.sleep(wait)
+            else:
+                return response
+            attempt += 1
+
+
+class HttpMeter():
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes = 0
+
+    def add(self, response, stream=False):
+        # Reading a streamed body here would load the whole download into memory
+        size = int(response.headers.get("Content-Length") or 0) if stream else len(response.content)
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+
+    def get_usage(self):
+        with self.lock:
+            return self.requests, self.bytes
+
+
+class ScheduledSession(requests.Session):
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+        self.meter = HttpMeter()
+
+    def request(self, method, url, *args, **kwargs):
+        response = self.scheduler.send(super().request, method, url, *args, **kwargs)
+        self.meter.add(response, kwargs.get("stream", False))
+        return response
@@ -0,0 +1,134 @@
+import html, re
+
+
+def clean_cell(html_string):
+    text = html.unescape(re.sub(r'<[^>]+>', " ", html_string))
+    return " ".join(text.split())
+
+
+class Table():
+
+    TAG_PATTERN = re.compile(r'<(/?)(table|tr|th|td)\b[^>]*>', re.I)
+    ROW_PATTERN = re.compile(r'<(/?)(table|tr)\b', re.I)
+    CHECKPOINT = 100
+
+    def __init__(self, html_string, start, end):
+        self.html = html_string
+        self.start = start
+        self.end = end
+        self.checkpoints = None
+        self.row_count = None
+        self.header = None
+        first = next(self.scan(start), None)
+        if first and first[2]:
+            self.header = first[1]
+
+    def scan(self, position):
+        # Yields (offset, cells, header row) for each row of this table, skipping nested tables
+        depth = 0
+        row = None
+        row_start = None
+        only_headers = True
+        cell_start = None
+        for match in self.TAG_PATTERN.finditer(self.html, position, self.end):
+            closing, tag = match.group(1), match.group(2).lower()
+            if tag == "table":
+                depth += -1 if closing else 1
+                continue
+            if depth:
+                continue
+            if tag == "tr":
+                if not closing:
+                    row, row_start, only_headers = [], match.start(), True
+                elif row is not None:
+                    yield row_start, row, only_headers and bool(row)
+                    row = None
+            elif row is not None:
+                if not closing:
+                    cell_start = match.end()
+                    only_headers = only_headers and tag == "th"
+                elif cell_start is not None:
+                    row.append(clean_cell(self.html[cell_start:match.start()]))
+                    cell_start = None
+
+    def index(self):
+        if self.checkpoints is None:
+            # Only row offsets every CHECKPOINT rows are kept, so memory stays small for huge tables
+            checkpoints = []
+            count = 0
+            depth = 0
+            for match in self.ROW_PATTERN.finditer(self.html, self.start, self.end):
+                if match.group(2).lower() == "table":
+                    depth += -1 if match.group(1) else 1
+                elif not depth and not match.group(1):
+                    if count % self.CHECKPOINT == 0:
+                        checkpoints.append(match.start())
+                    count += 1
+            self.checkpoints = checkpoints
+            self.row_count = count - (1 if self.header else 0)
+
+    def get_row_count(self):
+        self.index()
+        return self.row_count
+
+    def get_column_count(self):
+        if self.header:
+            return len(self.header)
+        row = next(self.iter_rows(1, 1), None)
+        return len(row[1]) if row else 0
+
+    def get_header(self, column):
+        if self.header and column <= len(self.header) and self.header[column-1]:
+            return self.header[column-1]
+        return f'Column {column}'
+
+    def find_column(self, name):
+        name = name.lower()
+        for column, header in enumerate(self.header or [], 1):
+            if header.lower().startswith(name):
+                return column
+        return None
+
+    def iter_rows(self, first, last):
+        # Only the requested rows are parsed, starting from the nearest checkpoint
+        self.index()
+        raw_first = first - 1 + (1 if self.header else 0)
+        checkpoint = min(raw_first // self.CHECKPOINT, len(self.checkpoints) - 1)
+        if checkpoint < 0:
+            return
+        raw = checkpoint * self.CHECKPOINT
+        for offset, row, header in self.scan(self.checkpoints[checkpoint]):
+            number = raw + 1 - (1 if self.header else 0)
+            raw += 1
+            if number < first:
+                continue
+            if number > last:
+                break
+            yield number, row
+
+
+class TableIndex():
+
+    TABLE_PATTERN = re.compile(r'<(/?)table\b[^>]*>', re.I)
+
+    def __init__(self, html_string):
+        self.tables = []
+        depth = 0
+        start = 0
+        for match in self.TABLE_PATTERN.finditer(html_string):
+            if not match.group(1):
+                if depth == 0:
+                    start = match.end()
+                depth += 1
+            elif depth:
+                depth -= 1
+                if depth == 0:
+                    self.tables.append(Table(html_string, start, match.start()))
+
+    def __len__(self):
+        return len(self.tables)
+
+    def get_table(self, number):
+        if 1 <= number <= len(self.tables):
+            return self.tables[number-1]
+        return None
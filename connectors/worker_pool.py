@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class WorkerPool():
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+
+    def run(self, function, items):
+        if not items:
+            return
+        workers = max(1, min(self.max_workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(function, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+
+def parse_selection(selection, maximum):
+    selected = []
+    if not selection:
+        return selected
+    selection = selection.replace(" ", "").lower()
+    if selection == "all":
+        return list(range(1, maximum + 1))
+    for part in selection.split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            if not start.isdigit() or not end.isdigit():
+                raise ValueError(f'Invalid range "{part}"')
+            numbers = range(int(start), int(end) + 1)
+        elif part.isdigit():
+            numbers = [int(part)]
+        else:
+            raise ValueError(f'Invalid option "{part}"')
+        for number in numbers:
+            if number < 1 or number > maximum:
+                raise ValueError(f'Option {number} is not in the list (1-{maximum})')
+            if number not in selected:
+                selected.append(number)
+    return selected
@@ -0,0 +1,142 @@
+import json, os, threading, time
+from os.path import abspath, dirname
+from os.path import exists
+from queue import Queue
+from uuid import uuid4
+
+
+class WriteConflict(Exception):
+    pass
+
+
+class WriteFailed(Exception):
+    pass
+
+
+journal_locks = {}
+journal_locks_lock = threading.Lock()
+
+
+def get_journal_lock(journal_file):
+    # Queues of several sites share a journal file, so they have to share its lock too
+    with journal_locks_lock:
+        return journal_locks.setdefault(abspath(journal_file), threading.Lock())
+
+
+class WriteBehindQueue():
+
+    def __init__(self, journal_file="journal.jsonl", max_retries=5, retry_delay=2):
+        self.journal_file = journal_file
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.handlers = {}
+        self.pending = {}
+        self.deferred = {}
+        self.queue = Queue()
+        self.lock = get_journal_lock(journal_file)
+        self.thread = None
+        self.site = None
+        self.notify = print
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def open(self, site, notify):
+        self.site = site
+        self.notify = notify
+        resumed = 0
+        for entry in self.load():
+            if entry["site"] == site and entry["id"] not in self.pending and entry["id"] not in self.deferred:
+                self.pending[entry["id"]] = entry
+                self.queue.put(entry)
+                resumed += 1
+        if resumed:
+            self.start()
+        return resumed
+
+    def start(self):
+        if not self.thread:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def load(self):
+        entries = {}
+        if exists(self.journal_file):
+            with open(self.journal_file, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record["state"] == "pending":
+                        entries[record["id"]] = record["entry"]
+                    else:
+                        entries.pop(record["id"], None)
+        return list(entries.values())
+
+    def write(self, record):
+        with self.lock:
+            os.makedirs(dirname(self.journal_file) or ".", exist_ok=True)
+            with open(self.journal_file, "a", encoding="utf-8") as journal:
+                journal.write(json.dumps(record) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def compact(self):
+        with self.lock:
+            entries = self.load()
+            with open(f'{self.journal_file}.tmp', "w", encoding="utf-8") as journal:
+                for entry in entries:
+                    journal.write(json.dumps({ "id": entry["id"], "state": "pending", "entry": entry }) + "\n")
+            os.replace(f'{self.journal_file}.tmp', self.journal_file)
+
+    def put(self, kind, description, **data):
+        entry = {
+            "id": uuid4().hex,
+            "site": self.site,
+            "kind": kind,
+            "description": description,
+            "created": time.time(),
+            "data": data
+        }
+        self.write({ "id": entry["id"], "state": "pending", "entry": entry })
+        self.pending[entry["id"]] = entry
+        self.queue.put(entry)
+        self.start()
+        return entry
+
+    def done(self, entry, state):
+        self.write({ "id": entry["id"], "state": state })
+        self.pending.pop(entry["id"], None)
+        if not self.pending:
+            self.compact()
+
+    def run(self):
+        while True:
+            self.send(self.queue.get())
+
+    def send(self, entry):
+        handler = self.handlers[entry["kind"]]
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                message = handler(entry["data"])
+            except WriteConflict as e:
+                self.done(entry, "conflict")
+                self.notify(f'CONFLICT: {entry["description"]}: {e}')
+                return
+            except WriteFailed as e:
+                self.done(entry, "failed")
+                self.notify(f'ERROR: {entry["description"]} failed: {e}')
+                return
+            except Exception as e:
+                error = e
+                time.sleep(self.retry_delay * 2 ** attempt)
+                continue
+            self.done(entry, "done")
+            self.notify(message)
+            return
+        # Kept in the journal for the next start, but no longer treated as pending in this session
+        self.pending.pop(entry["id"], None)
+        self.deferred[entry["id"]] = entry
+        self.notify(f'ERROR: {entry["description"]} could not be sent ({error}). It is kept and retried on the next start')
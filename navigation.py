@@ -0,0 +1,49 @@
+import json, os
+from os.path import dirname, exists, join
+from connectors.models import STATE_DIR
+
+
+class NavigationModel():
+
+    def __init__(self, navigation_file=join(STATE_DIR, "navigation.json"), min_share=0.3, min_count=3):
+        self.navigation_file = navigation_file
+        self.min_share = min_share
+        self.min_count = min_count
+        self.transitions = {}
+        self.changes = 0
+        self.load()
+
+    def load(self):
+        if exists(self.navigation_file):
+            try:
+                with open(self.navigation_file, encoding="utf-8") as file:
+                    self.transitions = json.load(file).get("transitions", {})
+            except (OSError, ValueError):
+                self.transitions = {}
+
+    def save(self):
+        if not self.changes:
+            return
+        os.makedirs(dirname(self.navigation_file) or ".", exist_ok=True)
+        with open(f'{self.navigation_file}.tmp', "w", encoding="utf-8") as file:
+            json.dump({ "transitions": self.transitions }, file)
+        os.replace(f'{self.navigation_file}.tmp', self.navigation_file)
+        self.changes = 0
+
+    def record(self, previous, command):
+        if previous is None:
+            return
+        counts = self.transitions.setdefault(previous, {})
+        counts[command] = counts.get(command, 0) + 1
+        self.changes += 1
+        if self.changes >= 10:
+            self.save()
+
+    def predict(self, previous, limit=2):
+        counts = self.transitions.get(previous, {})
+        total = sum(counts.values())
+        predictions = []
+        for command, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            if count >= self.min_count and count / total >= self.min_share:
+                predictions.append(command)
+        return predictions
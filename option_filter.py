@@ -0,0 +1,144 @@
+import re
+from bisect import bisect_left
+
+
+class OptionIndex():
+
+    WORD_PATTERN = re.compile(r'\w+')
+
+    def __init__(self, descriptions):
+        self.size = len(descriptions)
+        self.postings = {}
+        for n, description in enumerate(descriptions):
+            for word in self.tokenize(description):
+                rows = self.postings.get(word)
+                if rows is None:
+                    self.postings[word] = [n]
+                elif rows[-1] != n:
+                    rows.append(n)
+        self.words = sorted(self.postings)
+        self.grams = None
+        self.masks = {}
+        self.matches = {}
+
+    def prepare(self):
+        for word in self.words:
+            self.get_mask(word)
+        self.get_grams_index()
+
+    def tokenize(self, text):
+        return self.WORD_PATTERN.findall(text.lower())
+
+    def get_grams(self, word):
+        padded = f' {word} '
+        return { padded[i:i+3] for i in range(len(padded) - 2) }
+
+    def search(self, text):
+        # Rows are kept as bits of one integer, so combining words is a single AND
+        mask = (1 << self.size) - 1
+        for token in self.tokenize(text):
+            mask &= self.match(token)
+            if not mask:
+                break
+        return mask
+
+    def match(self, token):
+        if token not in self.matches:
+            mask = 0
+            start = bisect_left(self.words, token)
+            for word in self.words[start:]:
+                if not word.startswith(token):
+                    break
+                mask |= self.get_mask(word)
+            if not mask:
+                for word in self.get_similar_words(token):
+                    mask |= self.get_mask(word)
+            self.matches[token] = mask
+        return self.matches[token]
+
+    def get_mask(self, word):
+        if word not in self.masks:
+            rows = self.postings[word]
+            bits = bytearray((rows[-1] >> 3) + 1)
+            for n in rows:
+                bits[n >> 3] |= 1 << (n & 7)
+            self.masks[word] = int.from_bytes(bits, "little")
+        return self.masks[word]
+
+    def get_grams_index(self):
+        if self.grams is None:
+            grams = {}
+            for word in self.words:
+                for gram in self.get_grams(word):
+                    grams.setdefault(gram, []).append(word)
+            self.grams = grams
+        return self.grams
+
+    def get_similar_words(self, token):
+        grams = self.get_grams_index()
+        # Words sharing a trigram are the only candidates within the allowed number of typos
+        candidates = set()
+        for gram in self.get_grams(token):
+            candidates.update(grams.get(gram, []))
+        max_distance = 1 if len(token) < 8 else 2
+        for word in candidates:
+            if abs(len(word) - len(token)) <= max_distance and self.get_distance(token, word, max_distance) <= max_distance:
+                yield word
+            elif len(word) > len(token) and self.get_distance(token, word[:len(token)], max_distance) <= max_distance:
+                yield word
+
+    def get_distance(self, first, second, limit):
+        previous = list(range(len(second) + 1))
+        for i, a in enumerate(first, 1):
+            current = [i]
+            for j, b in enumerate(second, 1):
+                current.append(min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (a != b)))
+            if min(current) > limit:
+                return limit + 1
+            previous = current
+        return previous[-1]
+
+
+class FilteredOptions():
+
+    def __init__(self, source, mask):
+        self.source = source
+        self.count = bin(mask).count("1")
+        self.remaining = mask
+        self.rows = []
+
+    def get_rows(self, start, end):
+        # Row numbers are taken from the mask only as far as they are shown
+        end = min(end, self.count)
+        while len(self.rows) < end:
+            lowest = self.remaining & -self.remaining
+            self.rows.append(lowest.bit_length() - 1)
+            self.remaining ^= lowest
+        return self.rows[start:end]
+
+    def describe(self, start, end):
+        if hasattr(self.source, "describe"):
+            return [self.source.describe(n, n + 1)[0] for n in self.get_rows(start, end)]
+        return [self.source[n].description for n in self.get_rows(start, end)]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.source[n] for n in self.get_rows(0, self.count)[index]]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.source[self.get_rows(index, index + 1)[0]]
+
+    def __iter__(self):
+        for n in self.get_rows(0, self.count):
+            yield self.source[n]
+
+
+def get_descriptions(options_list):
+    if hasattr(options_list, "descriptions"):
+        return options_list.descriptions
+    return [option.description for option in options_list]
@@ -0,0 +1,140 @@
+import os, sys
+
+
+class ScreenRecorder():
+
+    SCREEN_SIZE = 100000
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.screen = []
+
+    def record(self, text):
+        self.screen.append(text)
+        if len(self.screen) > 1000:
+            self.screen = ["".join(self.screen)[-self.SCREEN_SIZE:]]
+
+    def get_screen(self):
+        return "".join(self.screen)[-self.SCREEN_SIZE:]
+
+    def write(self, text):
+        self.record(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ScreenBuffer(ScreenRecorder):
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.parts = []
+
+    def write(self, text):
+        self.record(text)
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+        self.stream.flush()
+
+    def clear(self, code):
+        # Output that wasn't shown yet, such as messages while connecting, is kept on the new screen
+        pending = [part for part in self.parts if part != code]
+        self.parts = [code] + pending
+        self.screen = pending
+
+
+class OutputBackend():
+
+    name = "log"
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.__stdout__
+
+    def start(self):
+        self.buffer = ScreenRecorder(self.stream)
+        sys.stdout = self.buffer
+
+    def stop(self):
+        sys.stdout.flush()
+
+    def clear(self):
+        self.buffer.screen = []
+
+    def get_screen(self):
+        return self.buffer.get_screen()
+
+
+class StreamBackend(OutputBackend):
+
+    name = "stream"
+
+    def start(self):
+        super().start()
+        if hasattr(self.stream, "reconfigure"):
+            self.stream.reconfigure(line_buffering=True)
+
+    def stop(self):
+        super().stop()
+        if hasattr(self.stream, "reconfigure"):
+            self.stream.reconfigure(line_buffering=False)
+
+    def clear(self):
+        # Screen readers lose their place on a cleared screen, so only separate the screens
+        print()
+        self.buffer.screen = []
+
+
+class BufferedBackend(OutputBackend):
+
+    name = "buffered"
+    CLEAR = "\033[H\033[2J\033[3J"
+
+    def start(self):
+        self.buffer = ScreenBuffer(self.stream)
+        sys.stdout = self.buffer
+
+    def stop(self):
+        self.buffer.flush()
+        sys.stdout = self.stream
+
+    def clear(self):
+        self.buffer.clear(self.CLEAR)
+
+
+BACKENDS = {
+    "buffered": BufferedBackend,
+    "stream": StreamBackend,
+    "log": OutputBackend
+}
+
+
+def enable_escape_sequences():
+    if os.name != "nt":
+        return True
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except Exception:
+        pass
+    return False
+
+
+def get_output_backend(name):
+    if name == "buffered" and not enable_escape_sequences():
+        name = "stream"
+    backend = BACKENDS[name]()
+    backend.start()
+    return backend
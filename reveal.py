@@ -1,13 +1,20 @@
-import os
+import argparse, cProfile, io, os, pstats, sys, threading, time
 from copy import deepcopy
 import importlib
-from connectors.models import Instruction, Result, Question
+from contextlib import redirect_stdout
+from connectors.models import STATE_DIR, Instruction, Result, Question
 import connectors.output_printer
 from credentials import Credentials
+from navigation import NavigationModel
+from option_filter import FilteredOptions, OptionIndex, get_descriptions
+from session import SessionStore
+from output_backend import BACKENDS, get_output_backend
 
 class Reveal:
 
-    EXCLUDES = ["models", "__init__", "output_printer", "editor"]
+    PROFILE_DIR = os.path.join(STATE_DIR, "profiles")
+    PROFILE_LINES = 15
+    EXCLUDES = ["models", "__init__", "output_printer", "editor", "worker_pool", "scheduler", "write_queue", "replay", "table_index", "revisions", "feed", "page_references"]
 
     CONTEXTS = {
         "secundary": {
@@ -29,6 +36,53 @@ class Reveal:
                 "go_back",
                 history=False,
                 local=True
+            ),
+            "next": Instruction(
+                "Show the next page of the listed options",
+                "show_option_page",
+                parameter="next",
+                history=False,
+                local=True,
+                selection=True
+            ),
+            "prev": Instruction(
+                "Show the previous page of the listed options",
+                "show_option_page",
+                parameter="prev",
+                history=False,
+                local=True,
+                selection=True
+            ),
+            "page": Instruction(
+                "Show a page of the listed options, e.g. page 3",
+                "show_option_page",
+                parameterized="number",
+                history=False,
+                local=True,
+                selection=True
+            ),
+            "filter": Instruction(
+                "Narrow the listed options to those matching the text, small typos allowed. Type filter without text to list all options again",
+                "filter_options",
+                parameterized="text",
+                history=False,
+                local=True,
+                selection=True
+            ),
+            "profile": Instruction(
+                "Run a command and show where its time goes, e.g. profile children",
+                "profile_command",
+                parameterized="command",
+                history=False,
+                local=True,
+                selection=True
+            ),
+            "federate": Instruction(
+                "Search all saved connections at once with search and cql, or search only the current one again",
+                "set_federation",
+                parameterized="on|off",
+                history=False,
+                local=True
             )
         },
         "primary": {
@@ -37,6 +91,13 @@ class Reveal:
                 "connect",
                 local=True
             ),
+            "output": Instruction(
+                "Switch output mode: buffered (default), stream (for screen readers) or log (never clears the screen)",
+                "set_output",
+                parameterized="buffered|stream|log",
+                history=False,
+                local=True
+            ),
             "exit": Instruction(
                 "Exits the program",
                 "close",
@@ -51,17 +112,36 @@ class Reveal:
         "quit": "exit"
     }
 
-    def __init__(self):
+    def __init__(self, headless=False, output=None, http_fixture=None, http_mode=None, budget=False, prefetch=True):
         self.shortcuts = {}
         self.history = []
+        self.headless = headless
+        self.http_fixture = http_fixture
+        self.http_mode = http_mode
+        self.budget = budget
+        self.prefetch_enabled = prefetch
+        self.profiler = None
+        self.output = get_output_backend(output or ("log" if headless else "buffered"))
+        self.errors = 0
         self.connectors = list(self.get_connectors())
         self.connector = None
+        self.connector_name = None
+        self.site = None
+        self.username = None
+        self.session_store = SessionStore()
+        self.navigation = NavigationModel()
+        self.last_command = None
+        self.prefetch_thread = None
+        self.option_list = None
+        self.option_page = 0
+        self.option_index = None
+        self.index_thread = None
         self.printer = connectors.output_printer.OutputPrinter()
         self.clear_screen()
         self.cred = Credentials()
 
     def get_connectors(self):
-        connectors = os.listdir("connectors/")
+        connectors = os.listdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), "connectors"))
         for connector in connectors:
             if connector.endswith(".py"):
                 connector = connector.lower().removesuffix('.py')
@@ -72,13 +152,24 @@ class Reveal:
         for connector in self.connectors:
             if connector == selected:
                 try:
-                    connector_module = importlib.import_module(f'connectors.{connector}')
-                    self.connector = connector_module.get_connector()
+                    self.connector = self.create_connector(connector)
+                    self.connector_name = connector
                     print(self.connector)
                 except Exception as e:
                     print(f'ERROR: Connector file "{connector}" is not valid!')
                     print(f'Error details: {e}')
 
+    def create_connector(self, name):
+        # Every connector of a session, also those of federated sites, runs with the same options
+        connector = importlib.import_module(f'connectors.{name}').get_connector()
+        if self.http_mode:
+            connector.set_http_fixture(self.http_fixture, self.http_mode)
+        if not self.prefetch_enabled:
+            connector.set_prefetch(False)
+        if self.headless:
+            connector.set_headless(True)
+        return connector
+
     def connect(self, ignore=None):
         def connect_handler(options):
             selected = None
@@ -129,17 +220,246 @@ class Reveal:
         site = list(dict(credentials).keys())[option]
         username = dict(credentials)[site]
         secret = self.cred.get_secret(site, username)
+        self.site, self.username = site, username
         return self.connector.connect(f'https://{site}', username, secret)
 
+    def resume_session(self):
+        session = self.session_store.load()
+        if not session or session.get("connector") not in self.connectors:
+            return None
+        site = session.get("site")
+        credentials = self.cred.get_credentials() if self.cred.get_sites() else {}
+        if site not in credentials:
+            return None
+        print(f'Resume your last session on {site} ({session["connector"]})?')
+        print("Press Enter to resume, or type n and press Enter to choose a connection")
+        answer = input()
+        self.clear_screen()
+        if answer.strip():
+            return None
+        self.load_connector(session["connector"])
+        self.site, self.username = site, credentials[site]
+        secret = self.cred.get_secret(site, self.username)
+        cache = self.session_store.get_cache(session, self.username)
+        if not self.connector or not self.connector.connect(f'https://{site}', self.username, secret, cache):
+            self.connector = None
+            return None
+        self.history = self.session_store.get_history(session)
+        result_object = self.session_store.get_result(session)
+        self.clear_screen()
+        if session.get("screen"):
+            print(session["screen"].rstrip("\n"))
+        print(f'INFO: Resumed your last session on {site}. Type back to go back or menu for the main menu')
+        if self.history:
+            # Refresh the last screen's data while the user reads the saved copy
+            threading.Thread(target=self.revalidate, args=(self.history[-1], result_object), daemon=True).start()
+        return result_object
+
+    def revalidate(self, instruction_object, result_object):
+        try:
+            self.connector.revalidate(instruction_object, result_object)
+        except Exception:
+            pass
+
+    def save_session(self, result_object):
+        if self.connector and self.site and not self.headless:
+            self.session_store.save(self.connector_name, self.site, self.username, self.connector.get_cache(),
+                self.history, result_object, self.output.get_screen())
+
+    def connect_to(self, connector, site):
+        if not connector and len(self.connectors) == 1:
+            connector = self.connectors[0]
+        if connector not in self.connectors:
+            print(f'ERROR: Unknown connector "{connector}". Available: {", ".join(self.connectors)}', file=sys.stderr)
+            return False
+        site = self.cred.strip_site(site)
+        credentials = self.cred.get_credentials() if self.cred.get_sites() else {}
+        if self.http_mode == "replay":
+            # Replayed responses need no login, so no saved connection is required
+            with redirect_stdout(sys.stderr if self.headless else sys.stdout):
+                self.load_connector(connector)
+                self.site, self.username = site, credentials.get(site, "replay")
+                return self.connector.connect(f'https://{site}', self.username, "")
+        if site not in credentials:
+            print(f'ERROR: No saved connection for "{site}". Start the client without --site to create one', file=sys.stderr)
+            return False
+        with redirect_stdout(sys.stderr if self.headless else sys.stdout):
+            self.load_connector(connector)
+            secret = self.cred.get_secret(site, credentials[site])
+            self.site, self.username = site, credentials[site]
+            return self.connector.connect(f'https://{site}', credentials[site], secret)
+
     def close(self, ignore=None):
+        self.stop_profile()
+        self.navigation.save()
+        sys.stdout.flush()
         os._exit(0)
         
     def clear_screen(self, ignore=None):
-        os.system('cls' if os.name=='nt' else 'clear')
+        self.output.clear()
+
+    def set_output(self, instruction_object):
+        mode = str(instruction_object.parameter or "").lower()
+        if mode in BACKENDS:
+            self.output.stop()
+            self.output = get_output_backend(mode)
+        elif mode:
+            print(f'ERROR: Unknown output mode "{mode}". Choose from: {", ".join(BACKENDS)}')
+        print(f'OUTPUT MODE: {self.output.name}')
+        return Result(instruction_object.subject, instruction_object.context)
+
+    def show_option_page(self, instruction_object):
+        options_list = instruction_object.options_list
+        result_object = Result(instruction_object.subject, instruction_object.context, options_list)
+        if not options_list:
+            print("INFO: There is no list of options to page through")
+            return result_object
+        if options_list is not self.option_list:
+            self.option_list, self.option_page = options_list, 0
+        pages = self.printer.get_page_count(options_list)
+        parameter = str(instruction_object.parameter or "").lower()
+        if parameter == "next":
+            page = self.option_page + 1
+        elif parameter == "prev":
+            page = self.option_page - 1
+        elif parameter.isdigit():
+            page = int(parameter) - 1
+        else:
+            print(f'ERROR: Type page followed by a number from 1 to {pages}')
+            page = self.option_page
+        if page >= pages:
+            print("INFO: This is the last page")
+        elif page < 0:
+            print("INFO: This is the first page")
+        self.option_page = min(max(0, page), pages - 1)
+        print("\n".join(self.printer.output_option_page(options_list, self.option_page)))
+        return result_object
+
+    def filter_options(self, instruction_object):
+        source = getattr(instruction_object.options_list, "source", instruction_object.options_list)
+        result_object = Result(instruction_object.subject, instruction_object.context, instruction_object.options_list)
+        if not source:
+            print("INFO: There is no list of options to filter")
+            return result_object
+        text = instruction_object.parameter
+        if not text:
+            print(f'ALL {len(source)} OPTIONS:')
+            print("\n".join(self.printer.output_option_page(source)))
+            result_object.options_list = source
+            return result_object
+        filtered = FilteredOptions(source, self.get_option_index(source).search(text))
+        if not filtered:
+            print(f'No options match "{text}". Type filter without text to list all options again')
+            return result_object
+        print(f'{len(filtered)} OF {len(source)} OPTIONS MATCH: {text}')
+        print("\n".join(self.printer.output_option_page(filtered)))
+        print("Type filter without text to list all options again")
+        result_object.options_list = filtered
+        return result_object
+
+    def get_option_index(self, options_list):
+        if self.index_thread:
+            self.index_thread.join()
+            self.index_thread = None
+        if not self.option_index or self.option_index[0] is not options_list:
+            self.option_index = (options_list, OptionIndex(get_descriptions(options_list)))
+        return self.option_index[1]
+
+    def prepare_option_index(self, result_object):
+        options_list = result_object.options_list if result_object else None
+        if not options_list or not hasattr(options_list, "__len__") or len(options_list) <= self.printer.PAGE_SIZE:
+            return
+        options_list = getattr(options_list, "source", options_list)
+        if (self.index_thread and self.index_thread.is_alive()) or (self.option_index and self.option_index[0] is options_list):
+            return
+        # Long lists are indexed while the user reads them, so filtering is instant
+        self.index_thread = threading.Thread(target=self.build_option_index, args=(options_list,), daemon=True)
+        self.index_thread.start()
+
+    def build_option_index(self, options_list):
+        option_index = OptionIndex(get_descriptions(options_list))
+        option_index.prepare()
+        self.option_index = (options_list, option_index)
+
+    def profile_command(self, instruction_object):
+        result_object = Result(instruction_object.subject, instruction_object.context, instruction_object.options_list)
+        if not instruction_object.parameter:
+            print("ERROR: Type profile followed by a command, for example profile children")
+            return result_object
+        if self.profiler:
+            print("INFO: The whole session is already being profiled")
+            return self.handle_command(instruction_object.parameter, result_object)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result_object = self.handle_command(instruction_object.parameter, result_object)
+        finally:
+            profiler.disable()
+            self.report_profile(profiler, instruction_object.parameter.split(" ")[0])
+        return result_object
+
+    def start_profile(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_profile(self):
+        if self.profiler:
+            self.profiler.disable()
+            self.report_profile(self.profiler, "session")
+            self.profiler = None
+
+    def report_profile(self, profiler, name):
+        os.makedirs(self.PROFILE_DIR, exist_ok=True)
+        name = "".join(c if c.isalnum() else "-" for c in name)
+        profile_file = os.path.join(self.PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{name}.prof')
+        profiler.dump_stats(profile_file)
+        print(f'PROFILE: the {self.PROFILE_LINES} functions with the most time spent in them or in what they call')
+        pstats.Stats(profiler, stream=sys.stdout).strip_dirs().sort_stats("cumulative").print_stats(self.PROFILE_LINES)
+        print("NOTE: Work done in background threads and processes shows up as waiting")
+        print(f'Saved call statistics to {profile_file}. Open it with snakeviz or convert it with flameprof or gprof2dot')
+
+    def set_federation(self, instruction_object):
+        mode = str(instruction_object.parameter or "on").lower()
+        if mode == "off":
+            self.connector.set_peers({})
+            print(f'FEDERATED SEARCH: OFF. Searching {self.site} only')
+            return Result(instruction_object.subject, instruction_object.context)
+        if mode != "on":
+            print(f'ERROR: Unknown option "{mode}". Type federate on or federate off')
+            return Result(instruction_object.subject, instruction_object.context)
+        peers = {}
+        credentials = self.cred.get_credentials() if self.cred.get_sites() else {}
+        for site, username in credentials.items():
+            if site == self.site:
+                continue
+            connector = self.create_connector(self.connector_name)
+            with redirect_stdout(io.StringIO()):
+                connected = connector.connect(f'https://{site}', username, self.cred.get_secret(site, username))
+            if connected and connector.get_site():
+                peers[connector.get_site()] = connector
+            else:
+                print(f'WARNING: Could not connect to {site}')
+        self.connector.set_peers(peers)
+        print(f'FEDERATED SEARCH: ON. search and cql now run on {len(peers) + 1} sites: {", ".join([self.site] + [self.cred.strip_site(site) for site in peers])}')
+        print("Opening a result switches to its site")
+        return Result(instruction_object.subject, instruction_object.context)
+
+    def switch_site(self, instruction_object):
+        if instruction_object.local or not self.connector:
+            return
+        if instruction_object.site and instruction_object.site != self.connector.get_site():
+            self.connector = self.connector.hand_over(instruction_object.site)
+            if self.connector.get_site():
+                self.site = self.cred.strip_site(self.connector.get_site())
+                self.username = self.cred.get_credentials().get(self.site)
 
     def log_to_history(self, instruction_object):
         if instruction_object.history:
-            self.history.append(deepcopy(instruction_object))
+            history_object = deepcopy(instruction_object)
+            # The copy remembers the site, so going back returns to it
+            if not history_object.local and self.connector:
+                history_object.site = self.connector.get_site()
+            self.history.append(history_object)
 
     def go_back(self, instruction_object, parameter=None):
         result_object = Result(instruction_object.subject)
@@ -156,10 +476,11 @@ class Reveal:
 
     def get_option_instruction(self, command, options_list):
         instruction_object = None
-        if options_list and isinstance(options_list, list):
+        if options_list and hasattr(options_list, "__getitem__"):
             option = int(command) - 1
             if 0 <= option < len(options_list):
-                instruction_object = options_list[option]
+                # Menus list the connector's own instructions, which must not be changed when run
+                instruction_object = deepcopy(options_list[option])
         return instruction_object
     
     def get_available_commands(self, result_object=None):
@@ -200,6 +521,8 @@ class Reveal:
         if instruction_object and result_object and result_object.context != "global":
             instruction_object.subject = result_object.subject
             instruction_object.context = result_object.context
+        if instruction_object and result_object and instruction_object.selection:
+            instruction_object.options_list = result_object.options_list
         return instruction_object
 
     def get_instruction_object(self, command, result_object=None):
@@ -219,44 +542,134 @@ class Reveal:
         result_object = None
         if not instruction_object.parameter and parameter:
             instruction_object.parameter = parameter
+        self.switch_site(instruction_object)
         self.log_to_history(instruction_object)
         if instruction_object.local:
             result_object = getattr(self, instruction_object.function)(instruction_object)
         else:
             result_object = getattr(self.connector, instruction_object.function)(instruction_object)
         if result_object:
+            if result_object.questions and not result_object.answers and self.headless:
+                return Result(instruction_object.subject, instruction_object.context, error=f'{instruction_object.description} needs answers typed at the keyboard, which is not possible when running commands without prompting')
             if result_object.questions and not result_object.answers:
                 instruction_object.parameter = self.form_handler(result_object.questions)
                 result_object = getattr(self.connector, instruction_object.function)(instruction_object)
         return result_object
 
-    def input_handler(self, result_object=None, function=None):
-        answer = input()
-        if answer:
-            input_value = answer.split(" ")
-            if input_value[0].startswith("/") and len(input_value[0]) > 1:
-                input_value[0] = input_value[0][1:]
-                input_value.insert(0, "/")
-            command = input_value[0]
-            parameter = None if len(input_value) == 1 else " ".join(input_value[1:])
-            self.clear_screen()
-            instruction_object = self.get_instruction_object(command, result_object)
-            if not instruction_object:
-                instruction_object = self.get_instruction_object("help", result_object)
-                print(f"ERROR: Invalid command '{command}'. "
-                    + "These are the available commands:")
-            result_object = None
+    def print_notices(self):
+        if self.connector:
+            for notice in self.connector.get_notices():
+                print(notice)
+
+    def handle_command(self, answer, result_object=None):
+        input_value = answer.split(" ")
+        if input_value[0].startswith("/") and len(input_value[0]) > 1:
+            input_value[0] = input_value[0][1:]
+            input_value.insert(0, "/")
+        command = input_value[0]
+        parameter = None if len(input_value) == 1 else " ".join(input_value[1:])
+        self.clear_screen()
+        instruction_object = self.get_instruction_object(command, result_object)
+        if not instruction_object:
+            self.errors += 1
+            instruction_object = self.get_instruction_object("help", result_object)
+            print(f"ERROR: Invalid command '{command}'. "
+                + "These are the available commands:")
+        else:
+            self.record_navigation(command)
+        if self.budget:
+            self.connector.reset_http_usage()
+        error_count = self.connector.get_error_count() if self.connector else 0
+        if self.headless:
+            try:
+                result_object = self.execute_instruction_object(instruction_object, parameter)
+            except Exception as e:
+                print(f'ERROR: {instruction_object.function} failed ({e})')
+                self.errors += 1
+                result_object = None
+        else:
             result_object = self.execute_instruction_object(instruction_object, parameter)
-            if result_object:
-                if result_object.error:
-                    print(f'ERROR! {result_object.error}')
-                    result_object = self.go_back(instruction_object)
-                self.input_handler(result_object)
+        if self.connector and self.connector.get_error_count() > error_count:
+            self.errors += 1
+        if self.budget:
+            self.check_budget(instruction_object)
+        if result_object and result_object.error:
+            self.errors += 1
+            print(f'ERROR! {result_object.error}')
+            result_object = self.go_back(instruction_object)
+        return result_object
+
+    def record_navigation(self, command):
+        if not command.isdigit():
+            command = self.get_available_shortcuts().get(command, command)
+        self.navigation.record(self.last_command, command)
+        self.last_command = command
+
+    def start_prefetch(self, result_object):
+        if not self.connector or (self.prefetch_thread and self.prefetch_thread.is_alive()):
+            return
+        instruction_objects = []
+        for command in self.navigation.predict(self.last_command):
+            instruction_object = None if command == "help" else self.get_instruction_object(command, result_object)
+            if instruction_object and not instruction_object.local:
+                instruction_objects.append(instruction_object)
+        if instruction_objects:
+            self.prefetch_thread = threading.Thread(target=self.prefetch, args=(instruction_objects,), daemon=True)
+            self.prefetch_thread.start()
+
+    def prefetch(self, instruction_objects):
+        for instruction_object in instruction_objects:
+            try:
+                self.connector.prefetch(instruction_object)
+            except Exception:
+                pass
+
+    def check_budget(self, instruction_object):
+        usage = self.connector.get_http_usage()
+        budget = self.connector.BUDGETS.get(instruction_object.function)
+        if not usage or not budget:
+            return
+        requests, size = usage
+        max_requests, max_bytes = budget
+        status = "BUDGET"
+        if requests > max_requests or size > max_bytes:
+            self.errors += 1
+            status = "BUDGET EXCEEDED"
+        print(f'{status}: {instruction_object.function} made {requests} of {max_requests} requests and read {size} of {max_bytes} bytes', file=sys.stderr)
+
+    def input_handler(self, result_object=None, function=None):
+        while True:
+            self.print_notices()
+            self.start_prefetch(result_object)
+            self.prepare_option_index(result_object)
+            answer = input()
+            if answer:
+                result_object = self.handle_command(answer, result_object)
+                self.save_session(result_object)
             else:
-                self.input_handler()
-        else:
-            print("ERROR: Please enter a command. Type ? or help for help")
-            self.input_handler()
+                print("ERROR: Please enter a command. Type ? or help for help")
+                result_object = None
+
+    def read_commands(self, run=None, file=None):
+        if run:
+            yield from run.split(";")
+        if file == "-":
+            yield from sys.stdin
+        elif file:
+            with open(file, encoding="utf-8") as source:
+                yield from source
+
+    def run_commands(self, commands):
+        result_object = None
+        self.errors = 0
+        for command in commands:
+            command = command.strip()
+            if command and not command.startswith("#"):
+                result_object = self.handle_command(command, result_object)
+                self.print_notices()
+        self.navigation.save()
+        sys.stdout.flush()
+        return 1 if self.errors else 0
 
     def get_title(self, title, instruction_object):
         title = title.upper()
@@ -288,7 +701,7 @@ class Reveal:
     def show_menu(self, instruction_object, parameter=None):
         menu = self.connector.MENU[instruction_object.parameter]
         options_list = [*menu]
-        result_object = Result(instruction_object.subject, options_list=list(menu.values()))
+        result_object = Result(instruction_object.subject, options_list=deepcopy(list(menu.values())))
         print("\n".join(self.printer.output_options(options_list)))
         return result_object
 
@@ -327,9 +740,42 @@ class Reveal:
         return questions
 
 
-### TEST CODE ###
-
-reveal = Reveal()
-
-reveal.connect()
-reveal.input_handler()
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Accessible command-line client for Confluence and other services")
+    parser.add_argument("--connector", help="connector to use, for example confluence")
+    parser.add_argument("--site", help="saved connection to use, for example example.atlassian.net")
+    parser.add_argument("--run", help='commands to run without prompting, separated by ";", for example "cql type = page; 1; children"')
+    parser.add_argument("--file", help="file with one command per line to run without prompting, or - for stdin")
+    parser.add_argument("--output", choices=list(BACKENDS), help="output mode, default buffered (log when running commands)")
+    parser.add_argument("--record", metavar="FILE", help="save every HTTP request and response to FILE for --replay")
+    parser.add_argument("--replay", metavar="FILE", help="answer HTTP requests from a file saved with --record instead of the network")
+    parser.add_argument("--profile", action="store_true", help="profile the whole session and show where the time went when it ends")
+    parser.add_argument("--budget", action="store_true", help="report the requests and bytes of each command and fail when it exceeds its budget")
+    parser.add_argument("--no-prefetch", action="store_true", help="never load likely next pages in advance, for example on a metered connection")
+    arguments = parser.parse_args(arguments)
+    if arguments.record and arguments.replay:
+        parser.error("--record and --replay cannot be combined")
+    headless = bool(arguments.run or arguments.file)
+    if headless and not arguments.site:
+        parser.error("--site is required with --run or --file")
+    http_mode = "record" if arguments.record else "replay" if arguments.replay else None
+    reveal = Reveal(headless, arguments.output, arguments.record or arguments.replay, http_mode, arguments.budget, not arguments.no_prefetch)
+    if arguments.profile:
+        reveal.start_profile()
+    result_object = None
+    if arguments.site:
+        if not reveal.connect_to(arguments.connector, arguments.site):
+            sys.exit(2)
+    else:
+        result_object = reveal.resume_session()
+        if not result_object and not reveal.connector:
+            reveal.connect()
+    if headless:
+        exit_code = reveal.run_commands(reveal.read_commands(arguments.run, arguments.file))
+        reveal.stop_profile()
+        sys.exit(exit_code)
+    reveal.input_handler(result_object)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json, os, time
+from os.path import dirname, exists, join
+from connectors.models import STATE_DIR, Instruction, OptionRows, Result
+
+
+class SessionStore():
+
+    FIELDS = ["description", "function", "context", "history", "subject", "endpoint", "parameter", "local", "title", "parameterized", "selection", "site", "ttl"]
+    HISTORY_SIZE = 20
+    SCREEN_SIZE = 100000
+
+    def __init__(self, session_file=join(STATE_DIR, "session.json"), ttl=3600):
+        self.session_file = session_file
+        self.ttl = ttl
+
+    def load(self):
+        if not exists(self.session_file):
+            return None
+        try:
+            with open(self.session_file, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, connector, site, username, cache, history, result_object, screen):
+        session = {
+            "connector": connector,
+            "site": site,
+            "username": username,
+            "saved": time.time(),
+            "cache": cache,
+            "history": [self.dump_instruction(i) for i in history[-self.HISTORY_SIZE:]],
+            "result": self.dump_result(result_object),
+            "screen": screen[-self.SCREEN_SIZE:]
+        }
+        try:
+            os.makedirs(dirname(self.session_file) or ".", exist_ok=True)
+            with open(f'{self.session_file}.tmp', "w", encoding="utf-8") as file:
+                json.dump(session, file)
+            os.replace(f'{self.session_file}.tmp', self.session_file)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def get_cache(self, session, username):
+        if session.get("cache") and session.get("username") == username and time.time() - session.get("saved", 0) < self.ttl:
+            return session["cache"]
+        return None
+
+    def get_history(self, session):
+        return [self.load_instruction(i) for i in session.get("history", [])]
+
+    def get_result(self, session):
+        result = session.get("result")
+        if not result:
+            return None
+        if "rows" in result:
+            rows = result["rows"]
+            options_list = OptionRows(rows["function"], rows["context"], **rows["options"])
+            options_list.descriptions, options_list.subjects = rows["descriptions"], rows["subjects"]
+        else:
+            options_list = [self.load_instruction(i) for i in result["options_list"]]
+        return Result(result["subject"], result["context"], options_list=options_list)
+
+    def dump_instruction(self, instruction_object):
+        instruction = {}
+        for field in self.FIELDS:
+            value = getattr(instruction_object, field, None)
+            instruction[field] = value if value is None or isinstance(value, (str, int, bool)) else None
+        return instruction
+
+    def load_instruction(self, instruction):
+        return Instruction(**{ k: v for k, v in instruction.items() if k in self.FIELDS })
+
+    def dump_result(self, result_object):
+        if not result_object:
+            return None
+        # A filtered list is saved as the full list it was filtered from
+        options_list = getattr(result_object.options_list, "source", result_object.options_list)
+        if isinstance(options_list, OptionRows):
+            rows = options_list
+            return {
+                "subject": result_object.subject if isinstance(result_object.subject, (str, int)) else None,
+                "context": result_object.context,
+                "rows": {
+                    "function": rows.function,
+                    "context": rows.context,
+                    "options": rows.options,
+                    "descriptions": rows.descriptions,
+                    "subjects": rows.subjects
+                }
+            }
+        options_list = options_list if isinstance(options_list, list) else []
+        if not all(isinstance(i, Instruction) for i in options_list):
+            options_list = []
+        return {
+            "subject": result_object.subject if isinstance(result_object.subject, (str, int)) else None,
+            "context": result_object.context,
+            "options_list": [self.dump_instruction(i) for i in options_list]
+        }
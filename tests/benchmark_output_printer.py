@@ -0,0 +1,31 @@
+# Compares rendering a large page at once with rendering it in parallel chunks.
+# Run from the repository root: python tests/benchmark_output_printer.py
+import os, sys, time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from connectors.output_printer import OutputPrinter
+
+
+def make_tables(tables, rows):
+    # format_tables does most of the work on pages like this
+    row = "".join(f'<td>Value {n}</td>' for n in range(6))
+    table = f'<table><tbody><tr>{"".join(f"<th>Column {n}</th>" for n in range(6))}</tr>{f"<tr>{row}</tr>" * rows}</tbody></table>'
+    return "".join(f'<h2>Table {n}</h2><p>Notes for table {n}.</p>{table}' for n in range(tables))
+
+
+for tables, rows in [(50, 200), (200, 200)]:
+    document = make_tables(tables, rows)
+    started = time.perf_counter()
+    serial = OutputPrinter(parallel_threshold=len(document) + 1).output_html2text(document)
+    serial_time = time.perf_counter() - started
+    printer = OutputPrinter(parallel_threshold=1)
+    printer.get_process_pool()
+    started = time.perf_counter()
+    first_part = None
+    chunked = ""
+    for text in printer.iter_html2text(document):
+        first_part = first_part or time.perf_counter() - started
+        chunked += text
+    chunked_time = time.perf_counter() - started
+    printer.process_pool.shutdown()
+    print(f'{tables} tables of {rows} rows ({len(document) // 1024} KB): serial {serial_time:.2f}s, '
+        f'chunked {chunked_time:.2f}s, first part after {first_part:.2f}s, same output: {chunked == serial}')
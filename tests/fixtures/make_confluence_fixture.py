@@ -0,0 +1,94 @@
+# Writes confluence.jsonl in the format of reveal.py --record, for a small made-up site.
+# Run from the repository root: python tests/fixtures/make_confluence_fixture.py
+import base64, json, os, sys
+from urllib.parse import urlencode
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from connectors.replay import get_request_key
+
+SITE = "https://example.atlassian.net"
+API = f'{SITE}/wiki/rest/api'
+PAGE_QUERY = "expand=history,space,version,childTypes.all,children.page,ancestors,body.editor2,body.view,metadata.currentuser,metadata.labels"
+USER = { "displayName": "Test User", "publicName": "test", "accountId": "u1" }
+SPACE = { "key": "DOC", "name": "Documentation", "type": "global", "status": "current", "_expandable": { "homepage": "/rest/api/content/1" } }
+records = []
+
+
+def add(method, url, body=None, status=200, params=None):
+    content = b"" if body is None else json.dumps(body).encode("utf-8")
+    records.append({
+        # The API client encodes the query itself and leaves commas as they are
+        "key": get_request_key(method, f'{url}?{urlencode(params, safe=",")}' if params else url),
+        "status": status,
+        "headers": { "Content-Type": "application/json" } if body is not None else {},
+        "body": base64.b64encode(content).decode("ascii")
+    })
+
+
+def page(page_id, title, ancestors, children, body, version=3):
+    return {
+        "id": page_id,
+        "type": "page",
+        "title": title,
+        "space": SPACE,
+        "version": { "number": version, "when": "2026-10-01T10:00:00.000Z", "by": USER },
+        "history": { "createdDate": "2026-01-01T10:00:00.000Z", "createdBy": USER },
+        "ancestors": [{ "id": a, "title": f'Page {a}' } for a in ancestors],
+        "children": { "page": { "results": [{ "id": c, "title": f'Page {c}' } for c in children] } },
+        "childTypes": { "attachment": { "value": False }, "comment": { "value": True }, "page": { "value": bool(children) } },
+        "body": { "view": { "value": body } },
+        "metadata": { "currentuser": { "favourited": { "isFavourite": False } }, "labels": { "results": [] } },
+        "_links": { "tinyui": f'/x/{page_id}' }
+    }
+
+
+def reference(page_id, title, body=None):
+    content = { "id": page_id, "title": title, "space": SPACE }
+    if body is not None:
+        content["body"] = { "storage": { "value": body } }
+    return { "content": content }
+
+
+def add_reference_search(keys, results, bodies=False):
+    # The search that looks up the linked and included pages of a page
+    conditions = " or ".join(f'(space = "{space_key}" and title = "{title}")' for space_key, title in keys)
+    add("GET", f'{SITE}/content/search', { "results": results, "totalSize": len(results) }, params={
+        "cql": f'type in (page, blogpost) and ({conditions})', "limit": len(keys) * 2, "expand": "content.space,content.body.storage" if bodies else "content.space" })
+
+
+TABLE = "<table><tr><th>Name</th><th>Owner</th></tr>" + "".join(f'<tr><td>Item {n}</td><td>Owner {n}</td></tr>' for n in range(1, 31)) + "</table>"
+LINKS = '<p>See <ac:link><ri:page ri:content-title="Welcome" ri:space-key="DOC"/></ac:link> and <ac:link><ri:page ri:content-title="Missing page"/></ac:link>.</p>'
+PAGE_1 = page("1", "Welcome", [], ["5", "6"], "<p>Start here.</p>")
+PAGE_6 = page("6", "Travel", ["1"], [], "<p>Book trips in advance.</p>", version=4)
+PAGE_5 = page("5", "Policy", ["1"], [], f'<h1>Policy</h1><p>Lock your screen.</p>{LINKS}{TABLE}')
+TOPICS = "".join(f'<p><ac:link><ri:page ri:content-title="Topic {n}"/></ac:link></p>' for n in range(1, 31))
+INCLUDE = '<ac:structured-macro ac:name="include"><ac:parameter ac:name=""><ac:link><ri:page ri:content-title="Contacts"/></ac:link></ac:parameter></ac:structured-macro>'
+PAGE_7 = page("7", "Index", ["1"], [], f'<h1>Index</h1>{TOPICS}{INCLUDE}')
+CONTACTS = '<p>Ask the <ac:link><ri:page ri:content-title="Travel"/></ac:link> desk.</p>'
+
+add("GET", f'{API}/user/current', USER)
+add("GET", f'{SITE}/content/search', { "results": [{ "title": "Policy", "content": { "id": "5", "title": "Policy" } }] }, params={ "cql": "id = 5", "expand": "metdata" })
+add("GET", f'{API}/content/5?{PAGE_QUERY}&trigger=viewed', PAGE_5)
+add_reference_search([("DOC", "Welcome"), ("DOC", "Missing page")], [reference("1", "Welcome")])
+add("GET", f'{API}/content/1?{PAGE_QUERY}&trigger=viewed', PAGE_1)
+add("GET", f'{API}/content/6?{PAGE_QUERY}&trigger=viewed', PAGE_6)
+add("GET", f'{API}/content/5?status=historical&version=2&expand=body.editor2,body.view', { "id": "5", "body": { "view": { "value": "<h1>Policy</h1><p>Lock your door.</p>" } } })
+add("GET", f'{API}/content/5/child/comment?expand=body.editor2,history.contributers,history', { "results": [
+    { "id": "50", "body": { "editor2": { "value": "<p>Also lock the drawer.</p>" } }, "history": { "createdDate": "2026-10-02T10:00:00.000Z", "createdBy": USER } }] })
+add("GET", f'{API}/relation/favourite/from/user/current/to/content/5', status=404)
+add("PUT", f'{API}/relation/favourite/from/user/current/to/content/5', { "target": { "id": "5", "title": "Policy" } })
+add("GET", f'{API}/user/watch/content/5', { "watching": False })
+add("POST", f'{API}/user/watch/content/5', status=204)
+add("GET", f'{SITE}/content/search', { "results": [{ "lastModified": "2026-10-18T09:00:00.000Z", "content": {
+    "id": "6", "title": "Travel", "version": { "number": 4, "when": "2026-10-18T09:00:00.000Z", "by": { "displayName": "Other User", "accountId": "u2" } } } }] }, params={
+    "cql": '(watcher = currentUser() or space in favouriteSpaces()) and type in (page, blogpost) and lastModified >= now("-1440m") order by lastModified asc',
+    "start": 0, "limit": 50, "expand": "content.version" })
+add("GET", f'{SITE}/content/search', { "results": [{ "title": "Index", "content": { "id": "7", "title": "Index" } }] }, params={ "cql": "id = 7", "expand": "metdata" })
+add("GET", f'{API}/content/7?{PAGE_QUERY}&trigger=viewed', PAGE_7)
+# Topics 29 and 30 don't exist
+add_reference_search([("DOC", "Contacts")] + [("DOC", f'Topic {n}') for n in range(1, 31)],
+    [reference("8", "Contacts", CONTACTS)] + [reference(str(100 + n), f'Topic {n}') for n in range(1, 29)], True)
+add_reference_search([("DOC", "Travel")], [reference("6", "Travel")])
+
+with open(os.path.join(os.path.dirname(__file__), "confluence.jsonl"), "w", encoding="utf-8") as fixture:
+    for record in records:
+        fixture.write(json.dumps(record) + "\n")
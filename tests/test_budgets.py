@@ -0,0 +1,57 @@
+import os, sys
+import pytest
+import reveal
+from connectors.confluence import ConfluenceConnector
+from connectors.replay import get_safe_headers
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "confluence.jsonl")
+COMMANDS = "cql id = 5; 1; links; tables; table 1; row 2; changes 2; info; comments; favourite; watch; children; siblings; 2; space; 1; space; 2; feed"
+
+
+def run_replay(commands, monkeypatch, tmp_path, capfd):
+    # Runtime state is written to the working directory, so each run starts clean
+    monkeypatch.chdir(tmp_path)
+    # Reveal replaces stdout with its output backend
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    with pytest.raises(SystemExit) as exit_info:
+        reveal.main(["--connector", "confluence", "--site", "example.atlassian.net", "--replay", FIXTURE, "--budget", "--run", commands])
+    captured = capfd.readouterr()
+    return exit_info.value.code, captured.out + captured.err
+
+
+def test_commands_stay_within_budget(monkeypatch, tmp_path, capfd):
+    code, output = run_replay(COMMANDS, monkeypatch, tmp_path, capfd)
+    assert "No recorded response" not in output
+    assert "BUDGET EXCEEDED" not in output
+    assert "BUDGET: show_page made 2 of 3 requests" in output
+    assert "Welcome [1]" in output
+    assert "[page not found]" in output
+    assert code == 0
+
+
+def test_many_links_and_included_links_stay_within_budget(monkeypatch, tmp_path, capfd):
+    code, output = run_replay("cql id = 7; 1; links; next", monkeypatch, tmp_path, capfd)
+    assert "No recorded response" not in output
+    assert "BUDGET: show_page made 3 of 3 requests" in output
+    assert "29. Contacts" in output
+    assert "30. Travel" in output
+    assert code == 0
+
+
+def test_exceeded_budget_fails_the_run(monkeypatch, tmp_path, capfd):
+    monkeypatch.setattr(ConfluenceConnector, "BUDGETS", dict(ConfluenceConnector.BUDGETS, show_page=(1, 1024 * 1024)))
+    code, output = run_replay("cql id = 5; 1", monkeypatch, tmp_path, capfd)
+    assert "BUDGET EXCEEDED" in output
+    assert code == 1
+
+
+def test_recorded_headers_leave_out_credentials():
+    headers = get_safe_headers({ "Content-Type": "application/json", "Set-Cookie": "cloud.session.token=secret", "X-Atlassian-Token": "no-check", "X-Session-Id": "1" })
+    assert headers == { "Content-Type": "application/json" }
+
+
+def test_fixture_has_no_credentials():
+    with open(FIXTURE, encoding="utf-8") as fixture:
+        content = fixture.read().lower()
+    assert "set-cookie" not in content
+    assert "authorization" not in content
@@ -0,0 +1,79 @@
+import os
+from connectors.confluence import ConfluenceConnector
+
+
+class FakeResponse():
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        yield self.content
+
+
+class FakeSession():
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+def make_attachment(attachment_id, version, size):
+    return { "id": attachment_id, "title": "image.png", "version": { "number": version }, "extensions": { "fileSize": size },
+        "_links": { "download": f'/download/attachments/{attachment_id}/image.png' } }
+
+
+def make_connector(monkeypatch, tmp_path, responses):
+    monkeypatch.chdir(tmp_path)
+    connector = ConfluenceConnector()
+    connector.url = "https://example.atlassian.net"
+    connector.session = FakeSession(responses)
+    return connector
+
+
+def test_attachments_with_the_same_name_get_their_own_file(monkeypatch, tmp_path):
+    connector = make_connector(monkeypatch, tmp_path, [FakeResponse(200, b"first"), FakeResponse(200, b"other")])
+    first = connector.download_attachment(make_attachment("att1", 1, 5))
+    other = connector.download_attachment(make_attachment("att2", 1, 5))
+    assert first != other
+    assert os.path.basename(first) == "image (att1 v1).png"
+    with open(first, "rb") as file:
+        assert file.read() == b"first"
+
+
+def test_resume_asks_for_the_rest_of_the_same_file_only(monkeypatch, tmp_path):
+    connector = make_connector(monkeypatch, tmp_path, [FakeResponse(206, b"lo"), FakeResponse(200, b"changed")])
+    attachment = make_attachment("att1", 2, 5)
+    part = f'{connector.get_download_path(attachment)}.part'
+    os.makedirs(connector.DOWNLOAD_DIR)
+    with open(part, "wb") as file:
+        file.write(b"hel")
+    with open(f'{part}.validator', "w") as file:
+        file.write('"etag-1"')
+    path = connector.download_attachment(attachment)
+    assert connector.session.requests[0] == { "Range": "bytes=3-", "If-Range": '"etag-1"' }
+    with open(path, "rb") as file:
+        assert file.read() == b"hello"
+    # Without a validator the part can't be checked, so the download starts over
+    with open(part, "wb") as file:
+        file.write(b"stale")
+    os.remove(path)
+    path = connector.download_attachment(attachment)
+    assert connector.session.requests[1] == {}
+    with open(path, "rb") as file:
+        assert file.read() == b"changed"
@@ -0,0 +1,24 @@
+import io
+from output_backend import BufferedBackend, ScreenBuffer
+
+
+def test_clear_keeps_output_that_was_not_shown():
+    stream = io.StringIO()
+    buffer = ScreenBuffer(stream)
+    buffer.write("shown\n")
+    buffer.flush()
+    buffer.write("Sending 2 queued change(s)\n")
+    buffer.clear(BufferedBackend.CLEAR)
+    buffer.write("new screen\n")
+    buffer.flush()
+    assert stream.getvalue() == f'shown\n{BufferedBackend.CLEAR}Sending 2 queued change(s)\nnew screen\n'
+    assert buffer.get_screen() == "Sending 2 queued change(s)\nnew screen\n"
+
+
+def test_flushed_print_is_shown_at_once(monkeypatch):
+    stream = io.StringIO()
+    buffer = ScreenBuffer(stream)
+    monkeypatch.setattr("sys.stdout", buffer)
+    print("[1/20] WATCHED: Policy", flush=True)
+    print("not yet")
+    assert stream.getvalue() == "[1/20] WATCHED: Policy\n"
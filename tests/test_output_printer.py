@@ -0,0 +1,43 @@
+import random
+import pytest
+from connectors.output_printer import OutputPrinter
+
+
+def make_document(seed, blocks=400):
+    # Headings, paragraphs, lists, tables, rules and tasks in random order, like a long Confluence page
+    generator = random.Random(seed)
+    parts = []
+    for n in range(blocks):
+        kind = generator.choice(["h", "p", "ul", "table", "hr", "tasks", "pre"])
+        if kind == "h":
+            level = generator.randint(1, 3)
+            parts.append(f'<h{level}>Heading {n}</h{level}>')
+        elif kind == "p":
+            parts.append(f'<p>Paragraph {n} with <strong>bold</strong> and <a href="https://example.com/{n}">a link</a>.<br/>Second line.</p>')
+        elif kind == "ul":
+            parts.append("<ul>" + "".join(f'<li>Item {n}.{i}</li>' for i in range(generator.randint(1, 5))) + "</ul>")
+        elif kind == "table":
+            rows = "".join(f'<tr><td>Cell {n}.{r}.1</td><td>Cell {n}.{r}.2 | pipe</td></tr>' for r in range(generator.randint(1, 8)))
+            parts.append(f'<table><tbody><tr><th>Name</th><th>Value</th></tr>{rows}</tbody></table>')
+        elif kind == "hr":
+            parts.append("<hr/>")
+        elif kind == "tasks":
+            parts.append(f'<ac:task-list><ac:task><ac:task-id>{n}</ac:task-id><ac:task-status>incomplete</ac:task-status><ac:task-body>Task {n}</ac:task-body></ac:task></ac:task-list>')
+        else:
+            parts.append(f'<pre>code {n}\n  indented</pre>')
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_chunked_output_matches_serial_output(seed):
+    document = make_document(seed)
+    serial = OutputPrinter(parallel_threshold=len(document) + 1).output_html2text(document)
+    chunked = OutputPrinter(max_processes=2, parallel_threshold=1, chunk_size=4000)
+    parts = list(chunked.iter_html2text(document))
+    assert len(parts) > 1
+    assert "".join(parts) == serial
+
+
+def test_small_pages_are_rendered_at_once():
+    printer = OutputPrinter()
+    assert list(printer.iter_html2text("<p>Short page</p>")) == [printer.output_html2text("<p>Short page</p>")]
@@ -0,0 +1,32 @@
+from connectors.page_references import PageReferences
+
+WELCOME = ("DOC", "Welcome")
+CONTACTS = ("DOC", "Contacts")
+TRAVEL = ("HR", "Travel")
+
+
+def link(title, space_key=None):
+    space = f' ri:space-key="{space_key}"' if space_key else ""
+    return f'<ac:link><ri:page ri:content-title="{title}"{space}/></ac:link>'
+
+
+def include(title):
+    return f'<ac:structured-macro ac:name="include"><ac:parameter ac:name="">{link(title)}</ac:parameter></ac:structured-macro>'
+
+
+def test_links_are_numbered_in_reading_order():
+    references = PageReferences(f'<p>{link("Welcome")} and {link("Missing")} and {link("Unknown")}</p>', "DOC")
+    html_string, links = references.render({ WELCOME: { "id": "1", "title": "Welcome" }, ("DOC", "Missing"): None })
+    assert "Welcome [1]" in html_string
+    assert "Missing [page not found]" in html_string
+    assert "Unknown [page not looked up]" in html_string
+    assert links == [{ "id": "1", "title": "Welcome" }]
+
+
+def test_links_inside_included_pages_are_numbered():
+    references = PageReferences(f'{include("Contacts")}<p>{link("Welcome")}</p>', "DOC")
+    contacts = { "id": "8", "title": "Contacts", "space": "HR", "body": f'<p>{link("Travel")}</p>' }
+    assert references.get_included_keys({ CONTACTS: contacts }) == [TRAVEL]
+    html_string, links = references.render({ CONTACTS: contacts, TRAVEL: { "id": "6", "title": "Travel" }, WELCOME: { "id": "1", "title": "Welcome" } })
+    assert "Travel [2]" in html_string
+    assert [link["title"] for link in links] == ["Contacts", "Travel", "Welcome"]
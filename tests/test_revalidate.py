@@ -0,0 +1,67 @@
+from connectors.confluence import ConfluenceConnector
+from connectors.models import Instruction, OptionRows, Result
+from connectors.revisions import RevisionStore
+
+
+class FakeConfluence():
+
+    def __init__(self, results):
+        self.results = results
+
+    def cql(self, cql, expand=None):
+        return { "results": self.results }
+
+
+class FakeResponse():
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return self.content
+
+
+class FakeSession():
+
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url):
+        return FakeResponse(self.content)
+
+
+def make_connector(tmp_path):
+    connector = ConfluenceConnector()
+    connector.url = "https://example.atlassian.net"
+    connector.revisions = RevisionStore(str(tmp_path))
+    return connector
+
+
+def make_list(*page_ids):
+    option_rows = OptionRows("show_page", "page")
+    for page_id in page_ids:
+        option_rows.append(f'Page {page_id}', page_id)
+    return Result(None, options_list=option_rows)
+
+
+def test_changed_search_results_give_a_notice(tmp_path):
+    connector = make_connector(tmp_path)
+    connector.confluence = FakeConfluence([{ "content": { "id": "5" } }, { "content": { "id": "6" } }])
+    instruction = Instruction("Favourite pages", "list_cql_results", parameter="favourite = currentUser()")
+    connector.revalidate(instruction, make_list("5", "6"))
+    assert connector.get_notices() == []
+    connector.revalidate(instruction, make_list("5"))
+    assert connector.get_notices() == ["UPDATED: Favourite pages has changed since it was shown. Open it again to see the new version"]
+
+
+def test_newer_page_version_gives_a_notice(tmp_path):
+    connector = make_connector(tmp_path)
+    connector.revisions.mark_read(connector.url, "5", 2)
+    page = { "id": "5", "title": "Policy", "version": { "number": 3 }, "children": { "page": { "results": [] } } }
+    connector.session = FakeSession(page)
+    connector.revalidate(Instruction("Policy", "show_page", "page", subject="5"), Result("5", "page"))
+    assert connector.get_notices() == ["UPDATED: Policy has changed since it was shown. Open it again to see the new version"]
+    # The fetched page is used when the page is opened again
+    assert connector.take_prefetched(connector.get_page_query("5")) == page
@@ -0,0 +1,30 @@
+import os, sys
+import pytest
+from reveal import Reveal, main
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "confluence.jsonl")
+
+
+def test_every_connector_gets_the_session_options(monkeypatch, tmp_path):
+    # Reveal replaces stdout with its output backend
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.chdir(tmp_path)
+    reveal = Reveal(True, "log", FIXTURE, "replay", prefetch=False)
+    main = reveal.create_connector("confluence")
+    peer = reveal.create_connector("confluence")
+    for connector in [main, peer]:
+        assert connector.http_fixture == FIXTURE
+        assert connector.http_mode == "replay"
+        assert not connector.prefetch_enabled
+        assert connector.headless
+
+
+def test_headless_output_has_only_the_command_output(monkeypatch, tmp_path, capfd):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--connector", "confluence", "--site", "example.atlassian.net", "--replay", FIXTURE, "--run", "cql id = 5"])
+    captured = capfd.readouterr()
+    assert exit_info.value.code == 0
+    assert captured.out == "1 RESULTS FOR CQL QUERY: id = 5\n1. Policy\n"
+    assert "Logged in as user: Test User" in captured.err
@@ -0,0 +1,29 @@
+from connectors.confluence import ConfluenceConnector
+from connectors.revisions import RevisionStore, describe_changes
+
+
+def test_line_numbers_count_blank_lines():
+    changes = list(describe_changes("Title\n\nOld text\n\nEnd\n", "Title\n\nNew text\n\nEnd\n"))
+    assert changes == ["Changed at line 3:", "  Was: Old text", "  Now: New text"]
+
+
+def test_removed_lines_at_the_end():
+    changes = list(describe_changes("Title\n\nGone\n", "Title\n"))
+    assert changes == ["Removed 1 line(s) before line 2:", "  Gone"]
+
+
+def test_only_newest_versions_are_kept(tmp_path):
+    revisions = RevisionStore(str(tmp_path), versions=2)
+    for version in [1, 2, 3]:
+        revisions.save("https://example.atlassian.net", "5", version, f'Version {version}')
+    assert revisions.get_versions("https://example.atlassian.net", "5") == [2, 3]
+    assert revisions.load("https://example.atlassian.net", "5", 3) == "Version 3"
+
+
+def test_changed_hint_only_on_first_read_of_a_version(tmp_path):
+    connector = ConfluenceConnector()
+    connector.url = "https://example.atlassian.net"
+    connector.revisions = RevisionStore(str(tmp_path))
+    assert connector.remember_revision({ "id": "5", "version": { "number": 2 } }, "Version 2") is None
+    assert connector.remember_revision({ "id": "5", "version": { "number": 3 } }, "Version 3") == 2
+    assert connector.remember_revision({ "id": "5", "version": { "number": 3 } }, "Version 3") is None
@@ -0,0 +1,33 @@
+import time
+import requests
+from connectors.scheduler import RequestScheduler
+
+
+def make_response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+def test_long_retry_after_pauses_all_requests():
+    scheduler = RequestScheduler(backoff_max=60)
+    calls = []
+
+    def send_request(method, url):
+        calls.append(url)
+        return make_response(429, { "Retry-After": "120" })
+
+    response = scheduler.send(send_request, "GET", "https://example.atlassian.net/wiki/rest/api/space")
+    assert response.status_code == 429
+    assert len(calls) == 1
+    assert scheduler.blocked_until - time.monotonic() > 100
+    assert not scheduler.has_spare_capacity()
+
+
+def test_short_retry_after_is_retried():
+    scheduler = RequestScheduler()
+    responses = [make_response(429, { "Retry-After": "0" }), make_response(200)]
+    response = scheduler.send(lambda method, url: responses.pop(0), "POST", "https://example.atlassian.net/wiki/rest/api/content")
+    assert response.status_code == 200
+    assert scheduler.is_throttled()
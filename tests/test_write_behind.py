@@ -0,0 +1,48 @@
+import threading
+from connectors.confluence import ConfluenceConnector
+from connectors.models import Instruction
+
+USER = { "displayName": "Test User", "publicName": "test", "accountId": "u1" }
+
+
+def make_page():
+    return {
+        "id": "5",
+        "type": "page",
+        "title": "Policy",
+        "space": { "key": "DOC", "name": "Documentation" },
+        "version": { "number": 3, "when": "2026-10-01T10:00:00.000Z", "by": USER },
+        "history": { "createdDate": "2026-01-01T10:00:00.000Z", "createdBy": USER },
+        "ancestors": [],
+        "children": { "page": { "results": [] } },
+        "childTypes": { "attachment": { "value": False }, "comment": { "value": False }, "page": { "value": False } },
+        "body": { "view": { "value": "<p>Lock your screen.</p>" } },
+        "metadata": { "labels": { "results": [] } },
+        "_links": { "tinyui": "/x/5" }
+    }
+
+
+def test_page_can_be_shown_while_its_update_is_pending(monkeypatch, tmp_path, capsys):
+    # Runtime state is written to the working directory
+    monkeypatch.chdir(tmp_path)
+    connector = ConfluenceConnector()
+    connector.url = "https://example.atlassian.net"
+    connector.write_behind = True
+    connector.store_page(make_page())
+    release = threading.Event()
+    sent = threading.Event()
+    connector.write_queue.notify = lambda message: sent.set()
+    connector.write_queue.register("update_page", lambda data: release.wait(10) and "saved")
+    try:
+        connector.process_page_update(Instruction("Policy", "edit_page", "page", subject="5"), "TITLE=Policy\nLock your door.")
+        assert connector.has_pending_update("5")
+        connector.show_page_info(Instruction("Policy", "show_page_info", "page", subject="5"))
+        connector.show_page(Instruction("Policy", "show_page", "page", subject="5"))
+    finally:
+        release.set()
+        # The journal is written relative to the working directory, so the save has to finish here
+        sent.wait(10)
+    output = capsys.readouterr().out
+    assert "Version: 4" in output
+    assert "Last changed by: test (Test User)" in output
+    assert "Lock your door." in output